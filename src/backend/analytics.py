@@ -0,0 +1,234 @@
+"""
+Sales analytics
+Orders rolled up per UTC day, status, payment and delivery method in
+daily_sales, kept current by an ORM flush hook in the same transaction as
+the orders themselves. Reports for any date range sum the daily rows
+instead of scanning orders. backfill_analytics.py rebuilds the table.
+"""
+import json
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import func, inspect, insert, update, delete
+from sqlalchemy.orm import Session
+
+from database import DailySales, Order
+from stats import old_values
+
+# Order attributes a rollup row depends on
+TRACKED = ["created_at", "status", "payment_method", "delivery_method", "total", "items"]
+
+# Columns of a daily_sales key, in the order rollup_key() returns them
+KEY_COLUMNS = ["day", "status", "payment_method", "delivery_method"]
+
+INTERVALS = ("day", "week", "month")
+
+# Report dimensions -> daily_sales column
+DIMENSIONS = {
+    "status": DailySales.status,
+    "paymentMethod": DailySales.payment_method,
+    "deliveryMethod": DailySales.delivery_method,
+}
+
+sales_table = DailySales.__table__
+
+
+def item_units(items_json) -> int:
+    """Units across the lines of an order's items JSON"""
+    try:
+        items = json.loads(items_json) if items_json else []
+    except ValueError:
+        return 0
+    return sum(
+        int(item.get("quantity") or 0)
+        for item in (items if isinstance(items, list) else [])
+        if isinstance(item, dict)
+    )
+
+
+def rollup_key(values: dict) -> Optional[tuple]:
+    if values.get("created_at") is None:
+        return None
+    return (
+        values["created_at"].date(),
+        values.get("status") or "",
+        values.get("payment_method") or "",
+        values.get("delivery_method") or "",
+    )
+
+
+def _merge(deltas: dict, values: dict, sign: int):
+    key = rollup_key(values)
+    if key is None:
+        return
+    orders, revenue, items = deltas.get(key, (0, 0, 0))
+    deltas[key] = (
+        orders + sign,
+        revenue + sign * (values.get("total") or 0),
+        items + sign * item_units(values.get("items")),
+    )
+
+
+def record_flush(session: Session):
+    """after_flush hook: move the orders just written between rollup rows"""
+    deltas = {}
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            _merge(deltas, {name: getattr(obj, name) for name in TRACKED}, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            _merge(deltas, old_values(inspect(obj), TRACKED), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Order) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED):
+            continue
+        _merge(deltas, old_values(state, TRACKED), -1)
+        _merge(deltas, {name: getattr(obj, name) for name in TRACKED}, 1)
+
+    if deltas:
+        add(session, deltas)
+
+
+def _key_filter(key: tuple):
+    return [getattr(sales_table.c, column) == value for column, value in zip(KEY_COLUMNS, key)]
+
+
+def add(session: Session, deltas: dict):
+    """
+    Add {(day, status, payment, delivery): (orders, revenue, items)} within
+    the session's transaction; rows left without orders are removed
+    """
+    connection = session.connection()
+    for key, (orders, revenue, items) in deltas.items():
+        if not orders and not revenue and not items:
+            continue
+        updated = connection.execute(
+            update(sales_table).where(*_key_filter(key)).values(
+                orders=sales_table.c.orders + orders,
+                revenue=sales_table.c.revenue + revenue,
+                items=sales_table.c["items"] + items
+            )
+        ).rowcount
+        if not updated:
+            connection.execute(insert(sales_table).values(
+                **dict(zip(KEY_COLUMNS, key)), orders=orders, revenue=revenue, items=items
+            ))
+        elif orders < 0:
+            # e.g. the last pending order of a day was cancelled
+            connection.execute(delete(sales_table).where(*_key_filter(key), sales_table.c.orders <= 0))
+
+
+def rebuild(db: Session, batch_size: int = 1000) -> int:
+    """Recompute every rollup row from orders in one transaction; returns the number of orders"""
+    totals = defaultdict(lambda: (0, 0, 0))
+    count = 0
+    columns = [getattr(Order, name) for name in TRACKED]
+    for row in db.query(*columns).yield_per(batch_size):
+        _merge(totals, dict(zip(TRACKED, row)), 1)
+        count += 1
+
+    db.execute(delete(DailySales))
+    rows = [
+        {**dict(zip(KEY_COLUMNS, key)), "orders": orders, "revenue": revenue, "items": items}
+        for key, (orders, revenue, items) in totals.items()
+    ]
+    if rows:
+        db.execute(insert(DailySales), rows)
+    db.commit()
+    return count
+
+
+def period_start(day: date, interval: str) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())  # Monday
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def in_range(query, date_from: Optional[date], date_to: Optional[date]):
+    """Rollup rows with date_from <= day < date_to that still count orders"""
+    query = query.filter(DailySales.orders > 0)
+    if date_from:
+        query = query.filter(DailySales.day >= date_from)
+    if date_to:
+        query = query.filter(DailySales.day < date_to)
+    return query
+
+
+def summary(orders: int, revenue: float, items: int) -> dict:
+    return {
+        "orders": orders,
+        "revenue": round(revenue, 2),
+        "items": items,
+        "averageOrderValue": round(revenue / orders, 2) if orders else 0,
+    }
+
+
+def sales_series(db: Session, interval: str, date_from=None, date_to=None, statuses=None) -> dict:
+    """Orders, revenue, units and average order value per day, week or month"""
+    query = in_range(db.query(DailySales), date_from, date_to)
+    # Cancelled orders are left out unless asked for
+    if statuses:
+        query = query.filter(DailySales.status.in_(statuses))
+    else:
+        query = query.filter(DailySales.status != "cancelled")
+    
+    rows = query.with_entities(
+        DailySales.day, func.sum(DailySales.orders), func.sum(DailySales.revenue), func.sum(DailySales.items)
+    ).group_by(DailySales.day).order_by(DailySales.day)
+
+    periods = {}
+    for day, orders, revenue, items in rows:
+        start = period_start(day, interval)
+        total_orders, total_revenue, total_items = periods.get(start, (0, 0, 0))
+        periods[start] = (total_orders + orders, total_revenue + (revenue or 0), total_items + (items or 0))
+
+    totals = [sum(values) for values in zip(*periods.values())] or [0, 0, 0]
+    return {
+        "interval": interval,
+        "series": [{"period": start.isoformat(), **summary(*period)} for start, period in periods.items()],
+        "total": summary(*totals),
+    }
+
+
+def sales_breakdown(db: Session, dimension: str, date_from=None, date_to=None) -> list[dict]:
+    """
+    Per payment method, delivery method or status: orders, revenue, share of
+    all orders, and for methods how many of their orders completed or were
+    cancelled. Counts every status so the rates have the right denominator.
+    """
+    column = DIMENSIONS[dimension]
+    rows = in_range(db.query(DailySales), date_from, date_to).with_entities(
+        column, DailySales.status,
+        func.sum(DailySales.orders), func.sum(DailySales.revenue), func.sum(DailySales.items)
+    ).group_by(column, DailySales.status)
+
+    groups = {}
+    for value, status, orders, revenue, items in rows:
+        group = groups.setdefault(value, {"orders": 0, "revenue": 0, "items": 0, "completed": 0, "cancelled": 0})
+        group["orders"] += orders
+        group["revenue"] += revenue or 0
+        group["items"] += items or 0
+        if status in ("completed", "cancelled"):
+            group[status] += orders
+
+    all_orders = sum(group["orders"] for group in groups.values())
+    result = []
+    for value, group in sorted(groups.items(), key=lambda entry: -entry[1]["orders"]):
+        entry = {
+            "value": value or None,
+            **summary(group["orders"], group["revenue"], group["items"]),
+            "share": round(group["orders"] / all_orders, 4) if all_orders else 0,
+        }
+        if dimension != "status":
+            entry["completionRate"] = round(group["completed"] / group["orders"], 4) if group["orders"] else 0
+            entry["cancellationRate"] = round(group["cancelled"] / group["orders"], 4) if group["orders"] else 0
+        result.append(entry)
+    return result
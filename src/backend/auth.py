@@ -4,13 +4,22 @@ JWT token generation and verification
 """
 from datetime import datetime, timedelta
 from typing import Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import os
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 
 from database import get_db, User
+import metrics
 
 # Security configuration
 SECRET_KEY = "your-secret-key-change-in-production-use-env-variable"
@@ -23,6 +32,101 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # HTTP Bearer token
 security = HTTPBearer()
 
+# Verified principal cache: bounded size, entries re-verified after the TTL
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+class Principal:
+    """Authenticated user as verified from a token, detached from any DB session"""
+    __slots__ = ("id", "email", "name", "role")
+    
+    def __init__(self, id: int, email: str, name: str, role: str):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role = role
+
+class PrincipalCache:
+    """
+    LRU of verified tokens keyed by SHA-256 digest. A hit skips both the JWT
+    signature check and the user query; entries expire at the TTL or the
+    token's own exp, whichever is first.
+    """
+    
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (principal, expires_at)
+        self._by_user = {}  # user id -> set of digests
+    
+    def get(self, digest: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(digest)
+            self.misses += 1
+            return None
+    
+    def put(self, digest: str, principal: Principal, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        
+        with self._lock:
+            self._entries[digest] = (principal, expires_at)
+            self._entries.move_to_end(digest)
+            self._by_user.setdefault(principal.id, set()).add(digest)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+    
+    def invalidate_user(self, user_id: int):
+        """Forget every cached token of a user (role change, password reset, deletion)"""
+        with self._lock:
+            for digest in self._by_user.pop(user_id, set()):
+                self._entries.pop(digest, None)
+    
+    def _drop(self, digest: str):
+        principal, _ = self._entries.pop(digest)
+        digests = self._by_user.get(principal.id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[principal.id]
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries)
+            }
+
+principal_cache = PrincipalCache()
+
+metrics.register_gauge(
+    "auth_principal_cache_lookups_total", "Token lookups in the principal cache",
+    lambda: {("hit",): principal_cache.hits, ("miss",): principal_cache.misses}, ("result",), kind="counter"
+)
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.password_hash.history.has_changes():
+        principal_cache.invalidate_user(target.id)
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    principal_cache.invalidate_user(target.id)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -31,6 +135,101 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+# bcrypt runs in its own small pool so logins can't starve request handling
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "16"))
+
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+password_slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT)
+
+def timed_hash(func, *args):
+    with metrics.timed("bcrypt"):
+        return func(*args)
+
+async def run_password_task(func, *args):
+    """Run a hashing call in the password pool, 503 when its queue is full"""
+    if not password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return await asyncio.wrap_future(password_pool.submit(metrics.in_context(timed_hash, func, *args)))
+    finally:
+        password_slots.release()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await run_password_task(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await run_password_task(get_password_hash, password)
+
+# Login throttling: attempts allowed per client IP and account within the
+# window, plus a higher cap per client IP across all accounts
+LOGIN_ATTEMPTS_LIMIT = int(os.getenv("LOGIN_ATTEMPTS_LIMIT", "10"))
+LOGIN_IP_ATTEMPTS_LIMIT = int(os.getenv("LOGIN_IP_ATTEMPTS_LIMIT", "50"))
+LOGIN_ATTEMPTS_WINDOW = float(os.getenv("LOGIN_ATTEMPTS_WINDOW", "60"))
+
+# Reverse proxies whose X-Forwarded-For is believed
+TRUSTED_PROXIES = {
+    address.strip() for address in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if address.strip()
+}
+
+def client_ip(request: Request) -> str:
+    """Client address, from X-Forwarded-For when the peer is a trusted proxy"""
+    peer = request.client.host if request.client else "unknown"
+    if peer not in TRUSTED_PROXIES:
+        return peer
+    
+    # The nearest address not added by one of our own proxies
+    forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",")]
+    forwarded = [address for address in forwarded if address]
+    for address in reversed(forwarded):
+        if address not in TRUSTED_PROXIES:
+            return address
+    return forwarded[0] if forwarded else peer
+
+class LoginThrottle:
+    """Sliding-window attempt counter per key (client IP and account)"""
+    
+    def __init__(self, limit: int = LOGIN_ATTEMPTS_LIMIT, window: float = LOGIN_ATTEMPTS_WINDOW):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._attempts = {}  # key -> deque of attempt times
+    
+    def check(self, key: str):
+        """Record an attempt, 429 once the key is over its limit"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and now - attempts[0] > self.window:
+                attempts.popleft()
+            
+            if len(attempts) >= self.limit:
+                retry_after = int(self.window - (now - attempts[0])) + 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many login attempts, try again later",
+                    headers={"Retry-After": str(retry_after)}
+                )
+            
+            attempts.append(now)
+            
+            # Keep memory bounded under a spray of distinct keys
+            if len(self._attempts) > 10000:
+                self._attempts = {
+                    key: value for key, value in self._attempts.items()
+                    if value and now - value[-1] <= self.window
+                }
+
+login_throttle = LoginThrottle()
+# Stops one client rotating emails from keeping the bcrypt pool busy
+login_ip_throttle = LoginThrottle(limit=LOGIN_IP_ATTEMPTS_LIMIT)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -45,33 +244,42 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify JWT token"""
+def decode_token(token: str) -> dict:
+    """Verify a JWT and return its payload"""
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
-        email: str = payload.get("email")
-        
-        if user_id is None or email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-        
-        return {"user_id": user_id, "email": email}
-    
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
+    
+    if payload.get("user_id") is None or payload.get("email") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    
+    return payload
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify JWT token"""
+    payload = decode_token(credentials.credentials)
+    return {"user_id": payload["user_id"], "email": payload["email"]}
 
 def get_current_user(
-    token_data: dict = Depends(verify_token),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
-    """Get current authenticated user"""
-    user = db.query(User).filter(User.id == token_data["user_id"]).first()
+    """Get current authenticated user (cached per token)"""
+    digest = hashlib.sha256(credentials.credentials.encode()).hexdigest()
+    
+    principal = principal_cache.get(digest)
+    if principal is not None:
+        return principal
+    
+    payload = decode_token(credentials.credentials)
+    user = db.query(User).filter(User.id == payload["user_id"]).first()
     
     if not user:
         raise HTTPException(
@@ -79,9 +287,12 @@ def get_current_user(
             detail="User not found"
         )
     
-    return user
+    principal = Principal(user.id, user.email, user.name, user.role)
+    principal_cache.put(digest, principal, token_exp=payload.get("exp"))
+    
+    return principal
 
-def require_admin(current_user: User = Depends(get_current_user)):
+def require_admin(current_user: Principal = Depends(get_current_user)):
     """Require admin role"""
     if current_user.role != "admin":
         raise HTTPException(
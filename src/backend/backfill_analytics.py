@@ -0,0 +1,24 @@
+"""
+Rebuild the daily sales rollups from the orders table
+Run once after upgrading, or after editing orders with raw SQL:
+python backfill_analytics.py
+"""
+from database import init_db, SessionLocal
+from analytics import rebuild
+
+
+def main():
+    print("🔄 Rebuilding daily sales rollups...")
+    init_db()
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+    finally:
+        db.close()
+
+    print(f"✅ Rolled up {count} orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Load benchmark for a running API server
+Fires concurrent requests and reports throughput and latency percentiles
+
+Usage:
+    python benchmark.py                              # default storefront mix
+    python benchmark.py /api/products /api/collections -c 100 -n 5000
+    python benchmark.py --url http://staging:8000
+    python benchmark.py --logins 8                   # storefront while 8 clients log in nonstop
+    python benchmark.py /uploads/<file> -H "Range: bytes=0-65535"   # static file throughput
+    python benchmark.py --orders 5000 -c 200         # simultaneous checkouts, checks order numbers
+    python benchmark.py --orders 500 --sku <product id>   # all checkouts race for one product's stock
+
+For --logins, start the server with a high LOGIN_ATTEMPTS_LIMIT, otherwise
+most attempts are throttled (429) before reaching bcrypt.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Storefront requests a typical visitor makes
+DEFAULT_PATHS = [
+    "/api/products",
+    "/api/products/filters",
+    "/api/collections",
+    "/api/content/bootstrap",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Client:
+    """Keep-alive HTTP connection per thread"""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method: str, path: str, body=None, headers=None) -> tuple[int, float, bytes]:
+        """(status, latency in seconds, body); status 0 on connection errors"""
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            return 0, time.perf_counter() - start, b""
+        return status, time.perf_counter() - start, data
+
+
+def run_load(client: Client, paths: list[str], concurrency: int, total: int, headers=None) -> tuple[dict, float]:
+    """GET the paths round-robin; returns ({path: [(status, latency, body bytes)]}, elapsed)"""
+    results = {path: [] for path in paths}
+    lock = threading.Lock()
+
+    def worker(i: int):
+        path = paths[i % len(paths)]
+        status, latency, body = client.request("GET", path, headers=headers)
+        with lock:
+            results[path].append((status, latency, len(body)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(total)))
+    return results, time.perf_counter() - start
+
+
+def login_storm(client: Client, stop: threading.Event, email: str, password: str, statuses: Counter):
+    """Log in back to back until stopped"""
+    while not stop.is_set():
+        status, _, _ = client.request("POST", "/api/admin/login", {"email": email, "password": password})
+        statuses[status] += 1
+
+
+def fetch_product(client: Client, product_id: str = None) -> dict:
+    if product_id:
+        status, _, body = client.request("GET", f"/api/products/{product_id}")
+        return json.loads(body) if status == 200 else {"id": product_id, "price": 1}
+    status, _, body = client.request("GET", "/api/products?limit=1")
+    return json.loads(body)["data"][0] if status == 200 else {"id": "1", "price": 1}
+
+
+def place_orders(client: Client, count: int, concurrency: int, product: dict) -> tuple[list, list, float]:
+    """POST `count` one-item orders at once; returns ([(status, latency, 0)], [order numbers], elapsed)"""
+
+    def worker(i: int):
+        order = {
+            "items": [{"productId": str(product["id"]), "quantity": 1, "price": product["price"]}],
+            "customer": {"fullName": f"Load Test {i}", "email": f"load{i}@example.com", "phone": "+998900000000"},
+            "deliveryMethod": "pickup",
+            "paymentMethod": "cash",
+            "subtotal": product["price"],
+            "shipping": 0,
+            "total": product["price"],
+        }
+        status, latency, body = client.request("POST", "/api/orders", order)
+        number = json.loads(body).get("orderNumber") if status == 200 else None
+        return status, latency, number
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(worker, range(count)))
+    elapsed = time.perf_counter() - start
+
+    samples = [(status, latency, 0) for status, latency, _ in outcomes]
+    numbers = [number for _, _, number in outcomes if number]
+    return samples, numbers, elapsed
+
+
+def report(title: str, results: dict, elapsed: float):
+    print(f"\n{title}")
+    print(f"{'route':<40} {'reqs':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    everything = []
+    received = 0
+    for name, samples in results.items():
+        latencies = [latency * 1000 for _, latency, _ in samples]
+        errors = sum(1 for status, _, _ in samples if not 200 <= status < 400)
+        received += sum(size for _, _, size in samples)
+        everything.extend(latencies)
+        print(
+            f"{name:<40} {len(samples):>6} {errors:>6} "
+            f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f}"
+        )
+
+    print(
+        f"{'total':<40} {len(everything):>6} {'':>6} "
+        f"{percentile(everything, 50):>8.1f} {percentile(everything, 95):>8.1f} {percentile(everything, 99):>8.1f}"
+    )
+    print(
+        f"throughput: {len(everything) / elapsed:.0f} req/s, "
+        f"{received / elapsed / 1024 / 1024:.1f} MB/s over {elapsed:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent latency benchmark for the Orient Watch API")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS, help="GET paths to hit round-robin")
+    parser.add_argument("--url", default="http://localhost:8000", help="server base URL")
+    parser.add_argument("-c", "--concurrency", type=int, default=50, help="concurrent clients")
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="total requests")
+    parser.add_argument(
+        "-H", "--header", action="append", default=[], help="extra request header, e.g. \"Range: bytes=0-1023\""
+    )
+    parser.add_argument("--orders", type=int, default=0, help="place this many orders at once instead of GETs")
+    parser.add_argument("--sku", help="product id every --orders checkout buys; verifies no overselling")
+    parser.add_argument("--logins", type=int, default=0, help="rerun the load while this many clients log in")
+    parser.add_argument("--email", default="admin@orient.uz", help="login email for --logins")
+    parser.add_argument("--password", default="admin123", help="login password for --logins")
+    args = parser.parse_args()
+
+    client = Client(args.url)
+
+    if args.orders:
+        product = fetch_product(client, args.sku)
+        samples, numbers, elapsed = place_orders(client, args.orders, args.concurrency, product)
+        report(f"{args.orders} orders, concurrency {args.concurrency}", {"POST /api/orders": samples}, elapsed)
+        print(f"order numbers: {len(numbers)} issued, {len(set(numbers))} unique")
+
+        if args.sku:
+            before = product.get("stockQuantity")
+            # Fresh connection, the old one may have idled out
+            after = fetch_product(Client(args.url), args.sku).get("stockQuantity")
+            rejected = sum(1 for status, _, _ in samples if status == 409)
+            print(f"stock {before} -> {after}: {len(numbers)} sold, {rejected} rejected as out of stock")
+            if before is not None and after is not None:
+                verdict = "OK" if after >= 0 and before - after == len(numbers) else "MISMATCH"
+                print(f"stock check: {verdict}")
+        return
+
+    headers = dict(header.split(":", 1) for header in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+
+    # Warm up caches and connections
+    run_load(client, args.paths, min(args.concurrency, 4), len(args.paths) * 4, headers)
+
+    results, elapsed = run_load(client, args.paths, args.concurrency, args.requests, headers)
+    report(f"{args.requests} requests, concurrency {args.concurrency}, {args.url}", results, elapsed)
+
+    if args.logins:
+        stop = threading.Event()
+        statuses = Counter()
+        storm = [
+            threading.Thread(target=login_storm, args=(Client(args.url), stop, args.email, args.password, statuses))
+            for _ in range(args.logins)
+        ]
+        for thread in storm:
+            thread.start()
+
+        try:
+            results, elapsed = run_load(client, args.paths, args.concurrency, args.requests, headers)
+        finally:
+            stop.set()
+            for thread in storm:
+                thread.join()
+
+        report(f"same load while {args.logins} clients log in continuously", results, elapsed)
+        print(f"login responses: {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    main()
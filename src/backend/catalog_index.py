@@ -0,0 +1,281 @@
+"""
+In-memory faceted index over the products table
+Answers catalog filtering, counts and page slicing without querying SQLite
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Optional
+
+from database import Product
+
+# Facet columns indexed with one bitmap per distinct value
+FACET_FIELDS = ("movement", "case_material", "dial_color", "water_resistance", "collection")
+
+# Full reload interval, picks up writes made by other workers or scripts
+INDEX_MAX_AGE = float(os.getenv("CATALOG_INDEX_MAX_AGE", "30"))
+
+
+def iter_bits(bits: int):
+    """Yield set bit positions of a bitmap in ascending order"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class CatalogIndex:
+    """
+    Every product gets a stable slot number (catalog order). Facet values map
+    to int bitmaps of slots, so a filter is a chain of bitwise ANDs, the total
+    is a popcount and a page is a walk over the set bits.
+    """
+
+    def __init__(self, max_age: float = INDEX_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()  # one rebuild at a time
+        self._loaded_at: Optional[float] = None
+        self._reset()
+
+    def _reset(self):
+        self._slots = {}  # product id -> slot
+        self._ids = []  # slot -> product id (None once deleted)
+        self._rows = []  # slot -> indexed attributes
+        self._live = 0  # bitmap of slots holding a product
+        self._postings = {field: {} for field in FACET_FIELDS}
+        self._prices = []  # sorted (price, slot) pairs
+
+    # Maintenance
+    def load(self, db):
+        """Rebuild the whole index from the database"""
+        # Only the indexed columns, not whole Product objects
+        products = db.query(
+            Product.id,
+            *(getattr(Product, field) for field in FACET_FIELDS),
+            Product.price,
+            Product.updated_at,
+        ).all()
+
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._add(product)
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self.max_age
+
+    def ensure_loaded(self, db):
+        """
+        Load on first use and reload once the index is older than max_age.
+        A single caller rebuilds; while it does, the others keep answering
+        from the current index (they only wait when there is none yet, or
+        after invalidate()).
+        """
+        if not self._stale():
+            return
+
+        blocking = self._loaded_at is None
+        if not self._reload_lock.acquire(blocking=blocking):
+            return
+        try:
+            if self._stale():
+                self.load(db)
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self):
+        """Force a full reload on next use"""
+        self._loaded_at = None
+
+    def upsert(self, product: Product):
+        """Index a created or updated product (call after commit)"""
+        with self._lock:
+            slot = self._slots.get(product.id)
+            if slot is None:
+                self._add(product)
+            else:
+                self._unlink(slot)
+                self._link(slot, product)
+
+    def remove(self, product_id: str):
+        """Drop a deleted product from the index (call after commit)"""
+        with self._lock:
+            slot = self._slots.pop(product_id, None)
+            if slot is not None:
+                self._unlink(slot)
+                self._ids[slot] = None
+                self._rows[slot] = None
+
+    def _add(self, product: Product):
+        slot = len(self._ids)
+        self._slots[product.id] = slot
+        self._ids.append(product.id)
+        self._rows.append(None)
+        self._link(slot, product)
+
+    def _link(self, slot: int, product: Product):
+        row = {field: getattr(product, field) for field in FACET_FIELDS}
+        row["price"] = product.price or 0
+        row["updated_at"] = product.updated_at
+        self._rows[slot] = row
+
+        bit = 1 << slot
+        self._live |= bit
+        for field in FACET_FIELDS:
+            value = row[field]
+            if value is not None:
+                postings = self._postings[field]
+                postings[value] = postings.get(value, 0) | bit
+        insort(self._prices, (row["price"], slot))
+
+    def _unlink(self, slot: int):
+        row = self._rows[slot]
+        bit = 1 << slot
+        self._live &= ~bit
+        for field in FACET_FIELDS:
+            value = row[field]
+            if value is None:
+                continue
+            postings = self._postings[field]
+            remaining = postings.get(value, 0) & ~bit
+            if remaining:
+                postings[value] = remaining
+            else:
+                postings.pop(value, None)
+        pos = bisect_left(self._prices, (row["price"], slot))
+        if pos < len(self._prices) and self._prices[pos] == (row["price"], slot):
+            del self._prices[pos]
+
+    # Queries
+    def _price_bits(self, min_price: Optional[float], max_price: Optional[float]) -> int:
+        lo = 0 if min_price is None else bisect_left(self._prices, (min_price, -1))
+        hi = len(self._prices) if max_price is None else bisect_right(self._prices, (max_price, float("inf")))
+
+        bits = 0
+        for _, slot in self._prices[lo:hi]:
+            bits |= 1 << slot
+        return bits
+
+    def count(self, field: str, value) -> int:
+        """Number of products with a facet value"""
+        with self._lock:
+            return self._postings[field].get(value, 0).bit_count()
+
+    def bits_for(self, product_ids) -> int:
+        """Bitmap of the given product ids (e.g. full-text search hits)"""
+        bits = 0
+        with self._lock:
+            for product_id in product_ids:
+                slot = self._slots.get(product_id)
+                if slot is not None:
+                    bits |= 1 << slot
+        return bits
+
+    def versions(self, product_ids: list[str]) -> list[tuple]:
+        """(id, updated_at) pairs as last indexed, for serialization cache lookups"""
+        with self._lock:
+            return [
+                (product_id, self._rows[self._slots[product_id]]["updated_at"])
+                for product_id in product_ids
+                if product_id in self._slots
+            ]
+
+    def _narrow(self, bits: int, filters: dict, skip: Optional[str] = None) -> int:
+        for field, value in filters.items():
+            if value and field != skip:
+                bits &= self._postings[field].get(value, 0)
+        return bits
+
+    def _base_bits(self, min_price: Optional[float], max_price: Optional[float], within: Optional[int]) -> int:
+        bits = self._live if within is None else self._live & within
+
+        if bits and (min_price is not None or max_price is not None):
+            bits &= self._price_bits(min_price, max_price)
+
+        return bits
+
+    def match(
+        self,
+        filters: Optional[dict] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        within: Optional[int] = None,
+    ) -> int:
+        """Bitmap of products matching every given facet value and the price range, limited to `within`"""
+        with self._lock:
+            return self._narrow(self._base_bits(min_price, max_price, within), filters or {})
+
+    def facet_counts(
+        self,
+        filters: Optional[dict] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        within: Optional[int] = None,
+    ) -> dict:
+        """
+        Product count per value of every facet. With no arguments these are
+        catalog-wide totals. Otherwise each facet is counted within the current
+        selection minus its own filter, so every option shows how many products
+        would match if it were picked instead.
+        """
+        filters = filters or {}
+        with self._lock:
+            base = self._base_bits(min_price, max_price, within)
+
+            counts = {}
+            for field in FACET_FIELDS:
+                bits = self._narrow(base, filters, skip=field)
+                counts[field] = {
+                    value: (postings & bits).bit_count()
+                    for value, postings in self._postings[field].items()
+                }
+            return counts
+
+    def page(self, bits: int, offset: int, limit: int, after: Optional[str] = None) -> list[str]:
+        """
+        Product ids for one page of a match bitmap, in catalog order.
+        `after` (a product id) starts the page right behind that product;
+        KeyError if it is no longer indexed.
+        """
+        ids = []
+        with self._lock:
+            if after is not None:
+                start = self._slots[after] + 1
+                bits = bits >> start << start
+
+            for position, slot in enumerate(iter_bits(bits)):
+                if position < offset:
+                    continue
+                if len(ids) >= limit:
+                    break
+                ids.append(self._ids[slot])
+        return ids
+
+    def ranked_page(
+        self,
+        bits: int,
+        ranked_ids: list[str],
+        offset: int,
+        limit: int,
+        after: Optional[str] = None,
+    ) -> list[str]:
+        """One page of ranked ids (e.g. search order), keeping only those in the bitmap"""
+        with self._lock:
+            hits = [
+                product_id for product_id in ranked_ids
+                if product_id in self._slots and bits >> self._slots[product_id] & 1
+            ]
+        if after is not None:
+            try:
+                offset += hits.index(after) + 1
+            except ValueError:
+                raise KeyError(after)
+        return hits[offset:offset + limit]
+
+
+# Shared per-process index
+catalog_index = CatalogIndex()
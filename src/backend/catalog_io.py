@@ -0,0 +1,230 @@
+"""
+Bulk product import and export
+CSV or NDJSON, one product per row. Import validates each row with
+ProductCreate and upserts by SKU in batched transactions; export streams
+the table in the same format so a backup can be imported back.
+"""
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, write_lock, Product
+from schemas import ProductCreate
+from catalog_index import catalog_index
+from product_cache import product_cache
+from exports import session_rows
+from response_cache import content_cache
+import stats
+
+# Rows written per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_SIZE = int(os.getenv("IMPORT_MAX_SIZE", str(50 * 1024 * 1024)))  # 50MB
+
+# Export columns: the ProductCreate fields, so an export imports back as is, then the id.
+# Featured flags are left out, they belong to the ordered featured list.
+EXPORT_FIELDS = [
+    "sku", "name", "collection", "price", "image", "images", "description",
+    "features", "specs", "inStock", "stockQuantity",
+    "movement", "caseMaterial", "dialColor", "waterResistance", "id",
+]
+
+# Fields holding lists or objects, JSON-encoded inside CSV cells
+JSON_FIELDS = {"images", "features", "specs"}
+
+# ProductCreate field -> Product column, where the names differ
+COLUMNS = {
+    "inStock": "in_stock", "stockQuantity": "stock_quantity",
+    "caseMaterial": "case_material", "dialColor": "dial_color", "waterResistance": "water_resistance",
+}
+
+
+def product_slug(name: str) -> str:
+    """Product id derived from its name"""
+    return name.lower().replace(" ", "-").replace("&", "and")
+
+
+def unique_slug(slug: str) -> str:
+    """Slug with a random suffix, for names whose slug is taken"""
+    return f"{slug}-{str(uuid.uuid4())[:8]}"
+
+
+def product_values(product: ProductCreate, partial: bool = False) -> dict:
+    """Product column values from a validated row; partial keeps only fields the row set"""
+    data = product.dict(exclude_unset=partial)
+    values = {}
+    for field, value in data.items():
+        if field in JSON_FIELDS:
+            if value is None:
+                continue
+            value = json.dumps(value)
+        values[COLUMNS.get(field, field)] = value
+    return values
+
+
+def read_csv(file) -> Iterator[tuple]:
+    """(line, record or error) per data row; empty cells count as missing"""
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        record = {}
+        try:
+            for field, value in row.items():
+                if field is None or value is None or value == "":
+                    continue
+                field = field.strip()
+                record[field] = json.loads(value) if field in JSON_FIELDS else value
+        except ValueError as error:
+            yield reader.line_num, f"Invalid JSON in {field}: {error}"
+            continue
+        yield reader.line_num, record
+
+
+def read_ndjson(file) -> Iterator[tuple]:
+    """(line, record or error) per non-empty line"""
+    for line_number, line in enumerate(io.TextIOWrapper(file, encoding="utf-8-sig"), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield line_number, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, record
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+class ProductImport:
+    """Upserts validated rows by SKU, one transaction per batch, and reports per row"""
+
+    def __init__(self, db: Session, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.summary = {"created": 0, "updated": 0, "failed": 0}
+        self.rows = []
+        self._batch = []
+
+    def add(self, line: int, record):
+        if isinstance(record, str):
+            self._fail(line, None, record)
+            return
+        try:
+            product = ProductCreate(**record)
+        except ValidationError as error:
+            self._fail(line, record.get("sku"), validation_message(error))
+            return
+
+        self._batch.append((line, product))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _fail(self, line: int, sku, error: str):
+        self.summary["failed"] += 1
+        self.rows.append({"line": line, "sku": sku, "status": "failed", "error": error})
+
+    def flush(self):
+        """Write the pending batch: two lookups, one executemany per statement, one commit"""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        db = self.db
+        skus = {product.sku for _, product in batch if product.sku}
+        ids_by_sku = dict(db.query(Product.sku, Product.id).filter(Product.sku.in_(skus))) if skus else {}
+
+        slugs = {product_slug(product.name) for _, product in batch if product.sku not in ids_by_sku}
+        taken = {product_id for (product_id,) in db.query(Product.id).filter(Product.id.in_(slugs))}
+
+        now = datetime.utcnow()
+        inserts, updates, results = {}, {}, []
+        for line, product in batch:
+            product_id = ids_by_sku.get(product.sku) if product.sku else None
+            if product_id is None:
+                product_id = product_slug(product.name)
+                if product_id in taken:
+                    product_id = unique_slug(product_id)
+                taken.add(product_id)
+                inserts[product_id] = {"id": product_id, **product_values(product), "created_at": now, "updated_at": now}
+                if product.sku:
+                    ids_by_sku[product.sku] = product_id
+                status = "created"
+            elif product_id in inserts:
+                # Repeated SKU within the batch, the later row wins
+                inserts[product_id].update(product_values(product, partial=True))
+                status = "updated"
+            else:
+                updates.setdefault(product_id, {"id": product_id}).update(
+                    product_values(product, partial=True), updated_at=now
+                )
+                status = "updated"
+            results.append({"line": line, "sku": product.sku, "id": product_id, "status": status})
+
+        try:
+            with write_lock:
+                if inserts:
+                    db.execute(insert(Product), list(inserts.values()))
+                    stats.add(db, {"products": (len(inserts), 0)})
+                if updates:
+                    db.execute(update(Product), list(updates.values()))
+                db.commit()
+        except SQLAlchemyError as error:
+            db.rollback()
+            message = f"Batch not saved: {getattr(error, 'orig', None) or error}"
+            for result in results:
+                self._fail(result["line"], result["sku"], message)
+            return
+
+        for result in results:
+            self.summary[result["status"]] += 1
+        self.rows.extend(results)
+        for product_id in updates:
+            product_cache.invalidate(product_id)
+
+    def finish(self) -> dict:
+        self.flush()
+        if self.summary["created"] or self.summary["updated"]:
+            catalog_index.invalidate()
+            content_cache.bump("featured-watches", "collections")
+        return {**self.summary, "rows": self.rows}
+
+
+def import_products(file, format: str) -> dict:
+    """Import a seekable binary file, returns {created, updated, failed, rows}"""
+    db = SessionLocal()
+    try:
+        importer = ProductImport(db)
+        for line, record in READERS[format](file):
+            importer.add(line, record)
+        return importer.finish()
+    finally:
+        db.close()
+
+
+def export_record(product: Product) -> dict:
+    data = product.to_dict()
+    return {field: data[field] for field in EXPORT_FIELDS}
+
+
+def export_records() -> Iterator[dict]:
+    """Every product in EXPORT_FIELDS, streamed"""
+    for product in session_rows(lambda db: db.query(Product).order_by(Product.id)):
+        yield export_record(product)
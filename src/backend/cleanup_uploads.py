@@ -0,0 +1,112 @@
+"""
+Delete uploads no longer referenced by any product, collection, content row or order
+Run periodically (e.g. from cron): python cleanup_uploads.py [--dry-run]
+"""
+import argparse
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+from database import (
+    SessionLocal, Product, Collection, Order, ContentSiteLogo, ContentHero
+)
+from images import UPLOAD_DIR, VARIANTS_DIR, forget_manifest
+
+# Columns that may hold upload URLs, including JSON arrays and rich text
+REFERENCE_COLUMNS = [
+    Product.image, Product.images, Product.description,
+    Collection.image, Collection.description,
+    ContentSiteLogo.logo_url, ContentSiteLogo.logo_dark_url,
+    ContentHero.image,
+    Order.items,
+]
+
+UPLOAD_REFERENCE = re.compile(r"/uploads/([^/\"'?#\s]+)")
+
+# Files younger than this are kept, an admin may not have saved the form yet
+DEFAULT_GRACE_SECONDS = 24 * 3600
+
+
+def referenced_files(db) -> set[str]:
+    names = set()
+    for column in REFERENCE_COLUMNS:
+        for (value,) in db.query(column).filter(column.isnot(None)).yield_per(1000):
+            names.update(UPLOAD_REFERENCE.findall(value))
+    return names
+
+
+def sweep(db, grace_seconds: float = DEFAULT_GRACE_SECONDS, dry_run: bool = False) -> dict:
+    """Remove unreferenced uploads, their variants and stale temp files"""
+    upload_dir = Path(UPLOAD_DIR)
+    referenced = referenced_files(db)
+    cutoff = time.time() - grace_seconds
+    removed = {"files": 0, "variants": 0, "temp": 0, "bytes": 0}
+    kept_stems = set()
+
+    for entry in upload_dir.iterdir():
+        if not entry.is_file():
+            continue
+
+        stat = entry.stat()
+        if entry.name.startswith(".upload-"):
+            if stat.st_mtime < cutoff:
+                removed["temp"] += 1
+                removed["bytes"] += stat.st_size
+                if not dry_run:
+                    entry.unlink(missing_ok=True)
+            continue
+
+        if entry.name in referenced or stat.st_mtime >= cutoff:
+            kept_stems.add(entry.stem)
+            continue
+
+        removed["files"] += 1
+        removed["bytes"] += stat.st_size
+        if not dry_run:
+            entry.unlink(missing_ok=True)
+
+    # Variant folders whose original is gone
+    variants_root = upload_dir / VARIANTS_DIR
+    if variants_root.is_dir():
+        for folder in variants_root.iterdir():
+            if not folder.is_dir() or folder.name in kept_stems:
+                continue
+            removed["variants"] += 1
+            removed["bytes"] += sum(f.stat().st_size for f in folder.iterdir() if f.is_file())
+            if not dry_run:
+                shutil.rmtree(folder, ignore_errors=True)
+                forget_manifest(folder.name)
+
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    parser.add_argument(
+        "--grace", type=float, default=DEFAULT_GRACE_SECONDS,
+        help="keep files modified within this many seconds"
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(UPLOAD_DIR):
+        print(f"❌ Upload directory not found: {UPLOAD_DIR}")
+        return
+
+    db = SessionLocal()
+    try:
+        removed = sweep(db, args.grace, args.dry_run)
+    finally:
+        db.close()
+
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(
+        f"🧹 {verb} {removed['files']} files, {removed['variants']} variant folders, "
+        f"{removed['temp']} temp files ({removed['bytes'] / 1024 / 1024:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,28 +2,110 @@
 Database configuration and connection
 SQLite database with SQLAlchemy ORM
 """
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Float, Boolean, Text, Date, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import Session, sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
+from dotenv import load_dotenv
+from contextlib import nullcontext
 import json
+import os
+import threading
+
+from images import image_sources
+import metrics
+
+load_dotenv()
 
 # Database URL
-DATABASE_URL = "sqlite:///./orient.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./orient.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# SQLite has a single writer. Hot write paths of this process queue on this
+# lock instead of polling in SQLite's busy handler, which starves under load.
+write_lock = threading.Lock() if IS_SQLITE else nullcontext()
+
+# SQLite tuning applied to every new connection, empty value skips a pragma
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),  # readers never block the writer
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),  # safe with WAL, far fewer fsyncs
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),  # ms to wait for a lock
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),  # 256MB memory-mapped reads
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # negative = KiB, 64MB page cache
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Connection pools: the read pool serves public GET routes
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "20"))
+
+# Async drivers for the same database
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_url(url: str) -> str:
+    """Same database URL with its async driver"""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+def apply_sqlite_pragmas(dbapi_connection, read_only: bool = False):
+    """Configure a fresh SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        if value:
+            cursor.execute(f"PRAGMA {name}={value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def make_engine(url: str, pool_size: int, read_only: bool = False, is_async: bool = False):
+    """Engine with the configured pool, plus the pragma profile for SQLite"""
+    options = {}
+    if IS_SQLITE:
+        options["connect_args"] = {"check_same_thread": False}  # Needed for SQLite
+    if ":memory:" not in url and url not in ("sqlite://", "sqlite+aiosqlite://"):
+        options.update(pool_size=pool_size, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+        if is_async:
+            # aiosqlite would default to no pooling at all
+            options["poolclass"] = AsyncAdaptedQueuePool
+
+    new_engine = (create_async_engine if is_async else create_engine)(url, **options)
+
+    if IS_SQLITE:
+        target = new_engine.sync_engine if is_async else new_engine
+        event.listen(target, "connect", lambda conn, record: apply_sqlite_pragmas(conn, read_only))
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+    metrics.instrument_engine(
+        new_engine.sync_engine if is_async else new_engine,
+        ("async-" if is_async else "") + ("read" if read_only else "write")
+    )
+    return new_engine
 
-# Session
+# Create engines
+engine = make_engine(DATABASE_URL, POOL_SIZE)
+read_engine = make_engine(DATABASE_URL, READ_POOL_SIZE, read_only=True)
+
+# Async engines, queries run without blocking the event loop
+async_engine = make_engine(async_url(DATABASE_URL), POOL_SIZE, is_async=True)
+async_read_engine = make_engine(async_url(DATABASE_URL), READ_POOL_SIZE, read_only=True, is_async=True)
+
+# Sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
 
 # Dependency to get DB session
+# Handlers using it must be plain `def` so FastAPI runs them in its threadpool
 def get_db():
     db = SessionLocal()
     try:
@@ -31,6 +113,24 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get a read-only DB session from the read pool (public GET routes)
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get an async DB session, for `async def` handlers
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency to get a read-only async DB session
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
 # Models
 class User(Base):
     __tablename__ = "users"
@@ -71,13 +171,20 @@ class Product(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
+        images = json.loads(self.images) if self.images else []
         return {
             "id": str(self.id),
             "name": self.name,
             "collection": self.collection,
             "price": self.price,
             "image": self.image,
-            "images": json.loads(self.images) if self.images else [],
+            "images": images,
+            # Resized variants per image URL, for srcset
+            "imageSources": {
+                url: sources
+                for url in dict.fromkeys([self.image, *images])
+                if (sources := image_sources(url)) is not None
+            },
             "description": self.description,
             "features": json.loads(self.features) if self.features else [],
             "specs": json.loads(self.specs) if self.specs else {},
@@ -93,6 +200,13 @@ class Product(Base):
             "updatedAt": self.updated_at.isoformat() if self.updated_at else None,
         }
 
+class FeaturedProduct(Base):
+    """Home page featured watches in display order; Product.is_featured mirrors membership"""
+    __tablename__ = "featured_products"
+    
+    position = Column(Integer, primary_key=True, autoincrement=False)
+    product_id = Column(String, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, unique=True)
+
 class Collection(Base):
     __tablename__ = "collections"
     
@@ -131,10 +245,34 @@ class Order(Base):
     delivery_method = Column(String)
     delivery_address = Column(Text)  # JSON object
     notes = Column(Text)
+    # Stock was taken when the order was placed, so cancelling returns it and
+    # reopening takes it again; older orders never reserved any
+    stock_reserved = Column(Boolean, nullable=False, default=False, server_default=text("0"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship("User", back_populates="orders")
+    
+    # Keyset pagination: newest-first listing, optionally by status
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+    )
+
+class OrderItem(Base):
+    """One product line of an order, mirrors Order.items for SQL aggregates"""
+    __tablename__ = "order_items"
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(String, nullable=False)  # no FK, sales history outlives deleted products
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+    
+    # Sales per product and "orders containing product X"
+    __table_args__ = (
+        Index("ix_order_items_product_id_order_id", "product_id", "order_id"),
+    )
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -151,6 +289,12 @@ class Booking(Base):
     boutique = Column(String, default="Orient Ташкент")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Keyset pagination: newest-first listing, optionally by status
+    __table_args__ = (
+        Index("ix_bookings_created_at_id", "created_at", "id"),
+        Index("ix_bookings_status_created_at_id", "status", "created_at", "id"),
+    )
 
 class ContentSiteLogo(Base):
     __tablename__ = "content_site_logo"
@@ -195,6 +339,75 @@ class ContentHeritage(Base):
     years_text = Column(String, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class StatCounter(Base):
+    """Running count and amount per dashboard key, maintained by stats.py"""
+    __tablename__ = "stats"
+    
+    key = Column(String, primary_key=True)  # e.g. "orders", "orders:completed", "users:user"
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0)  # order totals, 0 for other keys
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DailySales(Base):
+    """Orders per UTC day, status, payment and delivery method, maintained by analytics.py"""
+    __tablename__ = "daily_sales"
+    
+    day = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    payment_method = Column(String, primary_key=True)  # "" when the order has none
+    delivery_method = Column(String, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)  # sum of order totals
+    items = Column(Integer, nullable=False, default=0)  # units across all lines
+
+# Dashboard counters and sales rollups change in the same transaction as the rows they count
+@event.listens_for(Session, "after_flush")
+def update_stat_counters(session, flush_context):
+    from stats import record_flush
+    record_flush(session)
+
+@event.listens_for(Session, "after_flush")
+def update_sales_rollups(session, flush_context):
+    from analytics import record_flush
+    record_flush(session)
+
+def add_missing_columns():
+    """create_all leaves existing tables alone: add model columns they lack (nullable or with a server default)"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = f"{column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    definition += f" NOT NULL DEFAULT {column.server_default.arg.text}"
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+
 # Create all tables
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    
+    # create_all skips indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
+    # Full-text search table and sync triggers
+    from search import init_search_index
+    init_search_index(engine)
+    
+    # Featured order, taken from is_featured on first run
+    with SessionLocal() as db:
+        if db.query(FeaturedProduct.position).first() is None:
+            featured = db.query(Product.id).filter(Product.is_featured == True).order_by(Product.created_at, Product.id).all()
+            db.add_all(FeaturedProduct(position=position, product_id=product_id) for position, (product_id,) in enumerate(featured))
+            db.commit()
+    
+    # Dashboard counters, counted from scratch on first run
+    from stats import init_stats
+    init_stats(engine)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Streaming CSV/NDJSON exports
+Rows are read from the read pool with yield_per and encoded a batch at a
+time, so memory stays flat however many rows are exported.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+
+from database import ReadSessionLocal
+from product_cache import encode_json
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rows fetched per round trip and encoded per chunk
+EXPORT_BATCH_SIZE = 500
+
+
+def session_rows(build_query: Callable[[Session], Query]) -> Iterator:
+    """Stream a query on its own read session, closed when the export ends or is dropped"""
+    db = ReadSessionLocal()
+    try:
+        yield from build_query(db).yield_per(EXPORT_BATCH_SIZE)
+    finally:
+        db.close()
+
+
+def csv_value(value):
+    """Lists and objects go into CSV cells as JSON"""
+    if isinstance(value, (list, dict)):
+        return encode_json(value).decode("utf-8")
+    return value
+
+
+def encode_batch(records: list[dict], fields: list[str], format: str) -> bytes:
+    if format == "ndjson":
+        return b"".join(encode_json(record) + b"\n" for record in records)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([csv_value(record.get(field)) for field in fields] for record in records)
+    return buffer.getvalue().encode("utf-8")
+
+
+def stream_records(records: Iterable[dict], fields: list[str], format: str) -> Iterator[bytes]:
+    """Encoded chunks: a header row for CSV, then EXPORT_BATCH_SIZE records per chunk"""
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(fields)
+        yield b"\xef\xbb\xbf" + buffer.getvalue().encode("utf-8")  # BOM for Excel
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield encode_batch(batch, fields, format)
+            batch = []
+
+    if batch:
+        yield encode_batch(batch, fields, format)
+
+
+def export_response(records: Iterable[dict], fields: list[str], format: str, name: str) -> StreamingResponse:
+    """Download of `records` as <name>-<date>.<format>"""
+    filename = f"{name}-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        stream_records(records, fields, format),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
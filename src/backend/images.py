@@ -0,0 +1,219 @@
+"""
+Image derivatives for uploads
+Resized, metadata-free WebP (and AVIF when Pillow supports it) variants,
+built in a worker pool and described by a srcset manifest per image
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError, features
+    try:
+        import pillow_avif  # noqa: F401  registers AVIF on Pillow builds without it
+    except ImportError:
+        pass
+except ImportError:  # Pillow is optional, uploads are then stored as-is
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+# Variants live in UPLOAD_DIR/variants/<image stem>/<width>.<format>
+VARIANTS_DIR = "variants"
+MANIFEST_NAME = "manifest.json"
+
+# Target widths in pixels; images are never upscaled
+IMAGE_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_WIDTHS", "320,640,1024,1600").split(","))
+
+# Threads encoding variants (resize and encode release the GIL)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+AVIF_QUALITY = int(os.getenv("IMAGE_AVIF_QUALITY", "60"))
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+
+# Manifests never change once written, so found ones are kept per stem
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def variant_formats() -> list[str]:
+    """Output formats this Pillow build can encode, best first"""
+    if Image is None:
+        return []
+    formats = []
+    if "AVIF" in Image.registered_extensions().values():
+        formats.append("avif")
+    if features.check("webp"):
+        formats.append("webp")
+    return formats
+
+
+def variants_path(stem: str) -> Path:
+    return Path(UPLOAD_DIR) / VARIANTS_DIR / stem
+
+
+def target_widths(width: int) -> list[int]:
+    """Configured widths capped at the original, so small images get one full-size variant"""
+    return sorted({min(target, width) for target in IMAGE_WIDTHS})
+
+
+def plan_variants(source_path: str) -> Optional[dict]:
+    """
+    Read only the image header and work out its manifest, so it can be
+    returned before the variants exist. None when Pillow is
+    missing; raises ValueError when the file is not a readable image or
+    has more pixels than Image.MAX_IMAGE_PIXELS.
+    """
+    formats = variant_formats()
+    if not formats:
+        return None
+
+    try:
+        with Image.open(source_path) as image:
+            width, height = image.size
+            orientation = image.getexif().get(0x0112)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ValueError("Not a valid image") from exc
+
+    # Pillow only refuses past twice its limit; anything over it would
+    # still be decoded whole when the variants are built
+    if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+        raise ValueError("Image has too many pixels")
+
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    return {
+        "width": width,
+        "height": height,
+        "variants": {fmt: target_widths(width) for fmt in formats},
+    }
+
+
+def write_manifest(stem: str, manifest: dict):
+    directory = variants_path(stem)
+    directory.mkdir(parents=True, exist_ok=True)
+    temp = directory / (MANIFEST_NAME + ".tmp")
+    temp.write_text(json.dumps(manifest))
+    os.replace(temp, directory / MANIFEST_NAME)
+    with _manifests_lock:
+        _manifests[stem] = manifest
+
+
+def build_variants(source_path: str, stem: str, manifest: dict):
+    """Encode every planned variant; each file appears atomically"""
+    directory = variants_path(stem)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        # Drop EXIF, XMP, ICC and any other metadata carried over
+        image.info = {}
+
+        for width in sorted({w for widths in manifest["variants"].values() for w in widths}, reverse=True):
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+            for fmt, widths in manifest["variants"].items():
+                if width not in widths:
+                    continue
+                target = directory / f"{width}.{fmt}"
+                temp = directory / f".{width}.{fmt}.tmp"
+                if fmt == "webp":
+                    resized.save(temp, "WEBP", quality=WEBP_QUALITY, method=4)
+                else:
+                    resized.save(temp, "AVIF", quality=AVIF_QUALITY)
+                os.replace(temp, target)
+
+
+def build_and_publish(source_path: str, stem: str, manifest: dict):
+    """
+    Encode the variants, then write the manifest that advertises them, so
+    image_sources never points at files that failed to encode. On failure
+    the partial variants are removed.
+    """
+    try:
+        build_variants(source_path, stem, manifest)
+    except Exception as exc:
+        logger.error("Image variants failed for %s: %s", source_path, exc)
+        shutil.rmtree(variants_path(stem), ignore_errors=True)
+        forget_manifest(stem)
+        return
+    write_manifest(stem, manifest)
+
+
+def queue_variants(source_path: str, manifest: dict):
+    """Queue the encoding of a stored image's planned variants on image_pool"""
+    image_pool.submit(build_and_publish, source_path, Path(source_path).stem, manifest)
+
+
+def load_manifest(stem: str) -> Optional[dict]:
+    with _manifests_lock:
+        manifest = _manifests.get(stem)
+    if manifest is not None:
+        return manifest
+
+    try:
+        manifest = json.loads((variants_path(stem) / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+    with _manifests_lock:
+        _manifests[stem] = manifest
+    return manifest
+
+
+def forget_manifest(stem: str):
+    with _manifests_lock:
+        _manifests.pop(stem, None)
+
+
+def image_sources(url: Optional[str], manifest: Optional[dict] = None) -> Optional[dict]:
+    """
+    srcset-ready description of an uploaded image URL:
+    {"width", "height", "srcset": {format: "url 320w, ..."}, "variants": {format: [{"width", "url"}]}}
+    None for external URLs or images without (finished) variants. Pass a
+    planned manifest to describe variants that are still being encoded.
+    """
+    if not url:
+        return None
+
+    path = urlsplit(url).path
+    prefix, _, filename = path.rpartition("/uploads/")
+    if not filename or "/" in filename:
+        return None
+
+    stem = Path(filename).stem
+    if manifest is None:
+        manifest = load_manifest(stem)
+    if manifest is None:
+        return None
+
+    base = url[: url.index(path)] + prefix + f"/uploads/{VARIANTS_DIR}/{stem}/"
+    variants = {
+        fmt: [{"width": width, "url": f"{base}{width}.{fmt}"} for width in widths]
+        for fmt, widths in manifest["variants"].items()
+    }
+    return {
+        "width": manifest["width"],
+        "height": manifest["height"],
+        "srcset": {
+            fmt: ", ".join(f"{item['url']} {item['width']}w" for item in items)
+            for fmt, items in variants.items()
+        },
+        "variants": variants,
+    }
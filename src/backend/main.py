@@ -2,14 +2,17 @@
 Orient Watch - FastAPI Backend
 Main application entry point
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
 from database import init_db
-from routes import admin, products, collections, orders, content, upload, bookings
+import metrics
+from static_files import UploadFiles
+from routes import admin, products, collections, orders, content, upload, bookings, analytics
 
 # Load environment variables
 load_dotenv()
@@ -40,6 +43,12 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Latency and SQL usage per route, served on /metrics (outermost, so it times everything)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Optional bearer token for /metrics, for when the API is exposed publicly
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # Include routers BEFORE mounting static files
 app.include_router(admin.router)
 app.include_router(products.router)
@@ -48,12 +57,13 @@ app.include_router(orders.router)
 app.include_router(content.router)
 app.include_router(upload.router)
 app.include_router(bookings.router)
+app.include_router(analytics.router)
 
 # Mount uploads directory AFTER routes
 upload_dir = os.getenv("UPLOAD_DIR", "uploads")
 if not os.path.exists(upload_dir):
     os.makedirs(upload_dir)
-app.mount("/uploads", StaticFiles(directory=upload_dir), name="uploads")
+app.mount("/uploads", UploadFiles(upload_dir), name="uploads")
 
 @app.get("/")
 def read_root():
@@ -68,6 +78,13 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text format, per worker process"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/api/test")
 def test_endpoint():
     """Test endpoint to verify API is working"""
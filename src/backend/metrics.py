@@ -0,0 +1,363 @@
+"""
+Request and query metrics
+Per-route latency, queries per request and time spent in SQL, recorded by
+MetricsMiddleware and cursor hooks on every engine, and served by /metrics
+in the Prometheus text format. Requests running more than
+METRICS_QUERY_THRESHOLD queries are logged with their most repeated
+statement, which is how N+1 loops show up.
+
+Everything lives in process memory: with several workers each one reports
+its own numbers.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Queries in one request above which it is logged as a possible N+1
+QUERY_THRESHOLD = int(os.getenv("METRICS_QUERY_THRESHOLD", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette adds the charset
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}  # label values -> [per-bucket counts, sum, count]
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge(Metric):
+    """Value read when /metrics is scraped; read() returns a number or {label values: number}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable, labels: tuple = (), kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def add(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as exc:
+                logger.error("Metric %s failed: %s", metric.name, exc)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency until the last body chunk is sent",
+    ("method", "route")
+))
+requests_total = registry.add(CounterMetric(
+    "http_requests_total", "Requests served", ("method", "route", "status")
+))
+request_queries = registry.add(Histogram(
+    "http_request_db_queries", "SQL statements executed per request",
+    ("method", "route"), QUERY_COUNT_BUCKETS
+))
+request_db_duration = registry.add(Histogram(
+    "http_request_db_duration_seconds", "Time per request spent executing SQL",
+    ("method", "route")
+))
+request_section_duration = registry.add(Histogram(
+    "http_request_section_duration_seconds", "Time per request spent in timed() sections such as bcrypt",
+    ("method", "route", "section")
+))
+over_threshold = registry.add(CounterMetric(
+    "http_requests_over_query_threshold_total",
+    f"Requests running more than {QUERY_THRESHOLD} SQL statements (possible N+1)",
+    ("method", "route")
+))
+query_duration = registry.add(Histogram(
+    "db_query_duration_seconds", "SQL statement latency, including queries outside requests",
+    ("engine",)
+))
+section_duration = registry.add(Histogram(
+    "app_section_duration_seconds", "Time in timed() sections, including work outside requests",
+    ("section",)
+))
+
+
+def register_gauge(name: str, help: str, read: Callable, labels: tuple = (), kind: str = "gauge"):
+    """Expose a value computed at scrape time, e.g. cache sizes or pool usage"""
+    registry.add(Gauge(name, help, read, labels, kind))
+
+
+def render() -> str:
+    return registry.render()
+
+
+class RequestStats:
+    """Queries and timed sections of the request in progress"""
+
+    __slots__ = ("queries", "query_time", "statements", "sections")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.sections = {}
+
+
+# Shared with threadpool endpoints, which run in a copy of the request's context
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def timed(section: str):
+    """Time a block into app_section_duration_seconds and the current request's sections"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        section_duration.observe(elapsed, section)
+        request = current_request.get()
+        if request is not None:
+            request.sections[section] = request.sections.get(section, 0.0) + elapsed
+
+
+def in_context(func: Callable, *args):
+    """Callable running func in the caller's context, for executors that don't copy it"""
+    context = copy_context()
+    return lambda: context.run(func, *args)
+
+
+# Engine name -> pool.checkedout
+pools_in_use = {}
+register_gauge(
+    "db_pool_connections_in_use", "Connections checked out of each engine's pool",
+    lambda: {(name,): read() for name, read in pools_in_use.items()}, ("engine",)
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def instrument_engine(engine, name: str):
+    """Count and time every statement run on a (sync) engine, and expose its pool usage"""
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        query_duration.observe(elapsed, name)
+        request = current_request.get()
+        if request is not None:
+            request.queries += 1
+            request.query_time += elapsed
+            request.statements[statement] += 1
+
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        starts = connection.info.get("query_start") if connection is not None else None
+        if starts:
+            starts.pop()
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        pools_in_use[name] = pool.checkedout
+
+
+def _shorten(statement: str, limit: int = 200) -> str:
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + "…"
+
+
+class RouteNames:
+    """Route path templates by endpoint, so labels stay bounded (/api/products/{product_id})"""
+
+    def __init__(self):
+        self._names = {}
+
+    def lookup(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        name = self._names.get(endpoint)
+        if name is None:
+            name = self._names[endpoint] = self._find(scope.get("app"), endpoint)
+        return name
+
+    @staticmethod
+    def _find(app, endpoint) -> str:
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                return route.path
+        return getattr(endpoint, "__name__", "unknown")
+
+
+route_names = RouteNames()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL usage per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            self.record(scope, stats, status_code, time.perf_counter() - start)
+
+    @staticmethod
+    def record(scope, stats: RequestStats, status_code: int, elapsed: float):
+        method = scope["method"]
+        route = route_names.lookup(scope)
+        request_duration.observe(elapsed, method, route)
+        requests_total.inc(method, route, str(status_code))
+        request_queries.observe(stats.queries, method, route)
+        request_db_duration.observe(stats.query_time, method, route)
+        for section, seconds in stats.sections.items():
+            request_section_duration.observe(seconds, method, route, section)
+
+        if stats.queries > QUERY_THRESHOLD:
+            over_threshold.inc(method, route)
+            statement, repeats = stats.statements.most_common(1)[0]
+            logger.warning(
+                "%s %s ran %d queries in %.2f ms of %.2f ms; most repeated (%dx): %s",
+                method, scope["path"], stats.queries, stats.query_time * 1000, elapsed * 1000,
+                repeats, _shorten(statement)
+            )
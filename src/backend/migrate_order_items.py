@@ -0,0 +1,69 @@
+"""
+Migration script to add the order_items table
+Creates it and backfills line items from the JSON in orders.items
+Safe to run again: orders that already have line items are skipped
+"""
+import json
+
+from sqlalchemy import insert
+
+from database import init_db, SessionLocal, Order, OrderItem
+
+BATCH_SIZE = 500
+
+
+def order_item_rows(order_id: int, items_json: str) -> list[dict]:
+    try:
+        items = json.loads(items_json) if items_json else []
+    except ValueError:
+        return []
+
+    rows = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        product_id = item.get("productId") or item.get("id")
+        if product_id is None:
+            continue
+        rows.append({
+            "order_id": order_id,
+            "product_id": str(product_id),
+            "quantity": int(item.get("quantity") or 1),
+            "price": float(item.get("price") or 0),
+        })
+    return rows
+
+
+def migrate():
+    print("🔄 Starting order items migration...")
+    init_db()
+
+    db = SessionLocal()
+    try:
+        without_items = ~Order.id.in_(db.query(OrderItem.order_id))
+        orders = lines = 0
+        last_id = 0
+
+        # Walk orders by id in batches, one transaction per batch
+        while True:
+            batch = db.query(Order.id, Order.items).filter(
+                Order.id > last_id, without_items
+            ).order_by(Order.id).limit(BATCH_SIZE).all()
+            if not batch:
+                break
+
+            rows = [row for order_id, items_json in batch for row in order_item_rows(order_id, items_json)]
+            if rows:
+                db.execute(insert(OrderItem), rows)
+            db.commit()
+
+            orders += len(batch)
+            lines += len(rows)
+            last_id = batch[-1][0]
+
+        print(f"✅ Backfilled {lines} line items from {orders} orders")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,106 @@
+"""
+Order and booking numbers
+Snowflake-style: UTC date, second of day, worker slot and a per-second
+sequence, e.g. ORD-20261018-5234503007. Unique across worker processes
+without querying the database.
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+# Slot of this process, 0-99. Give each host its own WORKER_ID (or range of
+# them) when several machines share a database; otherwise processes on one
+# host claim free slots through lock files in WORKER_ID_DIR.
+WORKER_ID = os.getenv("WORKER_ID")
+WORKER_ID_DIR = os.getenv("WORKER_ID_DIR", os.path.join(tempfile.gettempdir(), "orient-worker-ids"))
+MAX_WORKERS = 100
+
+# Numbers per worker per second; the generator waits for the next second past this
+SEQUENCE_SIZE = 1000
+
+try:
+    import fcntl
+
+    def _try_lock(handle) -> bool:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+except ImportError:  # Windows
+    import msvcrt
+
+    def _try_lock(handle) -> bool:
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+_worker_id = None
+_worker_lock_file = None  # held open for the life of the process
+_worker_guard = threading.Lock()
+
+
+def worker_id() -> int:
+    """This process's slot, claimed on first use; the OS releases the lock when it exits"""
+    global _worker_id, _worker_lock_file
+
+    with _worker_guard:
+        if _worker_id is not None:
+            return _worker_id
+
+        if WORKER_ID is not None:
+            _worker_id = int(WORKER_ID)
+            if not 0 <= _worker_id < MAX_WORKERS:
+                raise RuntimeError(f"WORKER_ID must be between 0 and {MAX_WORKERS - 1}")
+            return _worker_id
+
+        os.makedirs(WORKER_ID_DIR, exist_ok=True)
+        for slot in range(MAX_WORKERS):
+            handle = open(os.path.join(WORKER_ID_DIR, f"worker-{slot:02d}.lock"), "a+b")
+            if _try_lock(handle):
+                _worker_id, _worker_lock_file = slot, handle
+                return slot
+            handle.close()
+
+        raise RuntimeError(f"All {MAX_WORKERS} worker ids in {WORKER_ID_DIR} are taken")
+
+
+class NumberGenerator:
+    """Monotonic numbers for one prefix within this process"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._second = None
+        self._sequence = 0
+
+    def next(self) -> str:
+        worker = worker_id()
+        with self._lock:
+            if self._second is None:
+                # A previous owner of this slot may have issued numbers this second
+                self._second, self._sequence = int(time.time()), SEQUENCE_SIZE
+
+            while True:
+                now = int(time.time())
+                if now > self._second:
+                    self._second, self._sequence = now, 0
+                    break
+                if self._sequence < SEQUENCE_SIZE:
+                    break
+                time.sleep(max(0.001, self._second + 1 - time.time()))
+
+            second, sequence = self._second, self._sequence
+            self._sequence += 1
+
+        moment = datetime.fromtimestamp(second, timezone.utc)
+        second_of_day = moment.hour * 3600 + moment.minute * 60 + moment.second
+        return f"{self.prefix}-{moment:%Y%m%d}-{second_of_day:05d}{worker:02d}{sequence:03d}"
+
+
+order_numbers = NumberGenerator("ORD")
+booking_numbers = NumberGenerator("BK")
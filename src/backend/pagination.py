@@ -0,0 +1,59 @@
+"""
+Keyset (cursor) pagination helpers
+A cursor is an opaque token holding the sort key and id of the last row served
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+
+def encode_cursor(*values) -> str:
+    """Pack the last row's sort key values into an opaque URL-safe token"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """Unpack a cursor into one value of each type, 400 if it was tampered with or is stale"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Exact types, so true is not taken for an int id
+    if any(type(value) is not expected for value, expected in zip(values, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return values
+
+
+def keyset_page(query, created_at_column, id_column, cursor: str, limit: int):
+    """
+    Newest-first page of a query ordered by (created_at, id). A non-empty
+    cursor seeks past the last row served. Returns (rows, next_cursor).
+    """
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, str, id_column.type.python_type)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(created_at_column, id_column) < tuple_(created_at, last_id))
+
+    # One extra row tells whether another page exists
+    rows = query.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_at_column.key), getattr(last, id_column.key))
+
+    return rows, next_cursor
@@ -0,0 +1,79 @@
+"""
+Serialized product cache
+Product.to_dict() pre-encoded as JSON bytes, keyed by (product id, updated_at)
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Response
+
+import metrics
+
+# Max cached products per process (least recently used are evicted)
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+
+
+def encode_json(value) -> bytes:
+    """Encode like FastAPI's JSONResponse does"""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class ProductJSONCache:
+    """
+    A cached entry is only served while the caller's updated_at matches the
+    one it was encoded from, so a stale version is never returned even if an
+    invalidation was missed.
+    """
+
+    def __init__(self, max_entries: int = PRODUCT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # product id -> (updated_at, bytes)
+        self._lock = threading.Lock()
+
+    def lookup(self, product_id: str, updated_at) -> Optional[bytes]:
+        """Cached JSON for this exact version of a product, or None"""
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None or entry[0] != updated_at:
+                return None
+            self._entries.move_to_end(product_id)
+            return entry[1]
+
+    def encode(self, product) -> bytes:
+        """JSON for a loaded Product row, encoding and caching it on a miss"""
+        cached = self.lookup(product.id, product.updated_at)
+        if cached is not None:
+            return cached
+
+        with metrics.timed("product_encode"):
+            encoded = encode_json(product.to_dict())
+        with self._lock:
+            self._entries[product.id] = (product.updated_at, encoded)
+            self._entries.move_to_end(product.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+    def invalidate(self, product_id: str):
+        with self._lock:
+            self._entries.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def json_fragment_response(fragments: list[bytes], **fields) -> Response:
+    """{"data": [...fragments], **fields} assembled without re-encoding the fragments"""
+    body = b'{"data":[' + b",".join(fragments) + b"]"
+    for key, value in fields.items():
+        body += b',"' + key.encode() + b'":' + encode_json(value)
+    body += b"}"
+    return Response(content=body, media_type="application/json")
+
+
+# Shared per-process cache
+product_cache = ProductJSONCache()
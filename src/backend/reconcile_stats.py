@@ -0,0 +1,44 @@
+"""
+Recount dashboard counters from scratch and report drift
+Run after bulk SQL edits or periodically: python reconcile_stats.py [--check]
+"""
+import argparse
+import sys
+
+from database import SessionLocal, init_db
+from stats import reconcile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--check", action="store_true",
+        help="only report drift, exit with status 1 if there is any"
+    )
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        drift = reconcile(db, fix=not args.check)
+    finally:
+        db.close()
+
+    if not drift:
+        print("✅ Counters match the data")
+        return
+
+    for key, (stored_count, stored_amount), (count, amount) in drift:
+        line = f"  {key}: count {stored_count} -> {count}"
+        if stored_amount or amount:
+            line += f", amount {stored_amount:.2f} -> {amount:.2f}"
+        print(line)
+
+    if args.check:
+        print(f"⚠️ {len(drift)} counters drifted")
+        sys.exit(1)
+    print(f"🔧 Fixed {len(drift)} counters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Versioned response cache for public content endpoints
+Precomputed JSON bodies with strong ETags, answering If-None-Match with 304
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Callable
+
+from fastapi import Request, Response
+
+from product_cache import encode_json
+
+# Browser/CDN freshness for cached content responses, seconds
+CONTENT_CACHE_MAX_AGE = int(os.getenv("CONTENT_CACHE_MAX_AGE", "60"))
+
+# Server-side rebuild interval, picks up admin writes made in other workers
+CONTENT_CACHE_TTL = float(os.getenv("CONTENT_CACHE_TTL", "30"))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match covers this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Each key has a version that admin writes bump. Entries built under an
+    older version, or older than the TTL, are rebuilt on next request. The
+    ETag is a hash of the body, so it stays stable across rebuilds and
+    workers as long as the content does not change.
+    """
+
+    def __init__(self, ttl: float = CONTENT_CACHE_TTL, max_age: int = CONTENT_CACHE_MAX_AGE):
+        self.ttl = ttl
+        self.cache_control = f"public, max-age={max_age}"
+        self._lock = threading.Lock()
+        self._versions = {}  # key -> version
+        self._entries = {}  # key -> (version, built_at, body, etag)
+
+    def bump(self, *keys: str):
+        """Invalidate cached responses (call after the admin write commits)"""
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def body(self, key: str, build: Callable[[], object]) -> tuple[bytes, str]:
+        """(JSON body, ETag) for a key, building it when missing or stale"""
+        with self._lock:
+            version = self._versions.get(key, 0)
+            entry = self._entries.get(key)
+
+        if entry and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+            return entry[2], entry[3]
+
+        body = encode_json(build())
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        with self._lock:
+            # A bump during the build leaves the entry stale for the next request
+            self._entries[key] = (version, time.monotonic(), body, etag)
+        return body, etag
+
+    def _response(self, request: Request, body: bytes, etag: str) -> Response:
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def respond(self, request: Request, key: str, build: Callable[[], object]) -> Response:
+        """Cached response for a key, or 304 when the client already has it"""
+        body, etag = self.body(key, build)
+        return self._response(request, body, etag)
+
+    def respond_combined(self, request: Request, sections: dict[str, tuple[str, Callable[[], object]]]) -> Response:
+        """
+        One JSON object made of several cached bodies, {name: body}, where
+        sections maps each name to its (key, build). Only cold keys are built.
+        """
+        parts = []
+        for name, (key, build) in sections.items():
+            body, _ = self.body(key, build)
+            parts.append(encode_json(name) + b":" + body)
+
+        body = b"{" + b",".join(parts) + b"}"
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        return self._response(request, body, etag)
+
+
+# Shared per-process cache for content and collection responses
+content_cache = ResponseCache()
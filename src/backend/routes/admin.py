@@ -1,27 +1,41 @@
 """
 Admin routes - authentication and dashboard
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional
 import json
 
-from database import get_db, User, Product, Order
+from database import get_db, get_async_db, User, Product, Order, OrderItem
 from schemas import LoginRequest, LoginResponse
-from auth import verify_password, create_access_token, require_admin
+from stats import read_counters
+from auth import verify_password_async, login_throttle, login_ip_throttle, client_ip, create_access_token, require_admin, principal_cache
 
 router = APIRouter()
 
 @router.post("/api/admin/login", response_model=LoginResponse)
-async def admin_login(request: LoginRequest, db: Session = Depends(get_db)):
+async def admin_login(
+    request: LoginRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
     """Admin login"""
+    # Per address, and per account on a lower limit, so a client can't lock
+    # out every admin behind the same address
+    ip = client_ip(http_request)
+    login_ip_throttle.check(ip)
+    login_throttle.check(f"{ip} {request.email.lower()}")
+    
     # Find user
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         User.email == request.email,
         User.role == "admin"
-    ).first()
+    ))
     
-    if not user or not verify_password(request.password, user.password_hash):
+    if not user or not await verify_password_async(request.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -45,42 +59,75 @@ async def admin_login(request: LoginRequest, db: Session = Depends(get_db)):
     }
 
 @router.get("/api/admin/stats")
-async def get_stats(
+def get_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """Get dashboard statistics"""
-    total_products = db.query(func.count(Product.id)).scalar()
-    total_orders = db.query(func.count(Order.id)).scalar()
+    """Get dashboard statistics, from the counters kept by stats.py"""
+    counters = read_counters(db)
     
-    # Total revenue from completed orders
-    total_revenue = db.query(func.sum(Order.total)).filter(
-        Order.status == "completed"
-    ).scalar() or 0
+    return {
+        "totalProducts": counters.count("products"),
+        "totalOrders": counters.count("orders"),
+        # Revenue from completed orders
+        "totalRevenue": counters.amount("orders:completed"),
+        "totalUsers": counters.count("users:user"),
+        "pendingOrders": counters.count("orders:pending"),
+        "completedOrders": counters.count("orders:completed")
+    }
+
+@router.get("/api/admin/stats/products")
+def get_product_sales(
+    limit: int = Query(20, ge=1, le=100),
+    sort: str = Query("revenue", pattern="^(revenue|units|orders)$"),
+    order_status: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[datetime] = Query(None, alias="dateFrom"),
+    date_to: Optional[datetime] = Query(None, alias="dateTo"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Units sold, revenue and order count per product, best first.
+    Cancelled orders are left out unless asked for by status.
+    """
+    units = func.sum(OrderItem.quantity)
+    revenue = func.sum(OrderItem.quantity * OrderItem.price)
+    orders = func.count(func.distinct(OrderItem.order_id))
     
-    total_users = db.query(func.count(User.id)).filter(
-        User.role == "user"
-    ).scalar()
+    query = db.query(OrderItem.product_id, units, revenue, orders).join(Order, Order.id == OrderItem.order_id)
     
-    pending_orders = db.query(func.count(Order.id)).filter(
-        Order.status == "pending"
-    ).scalar()
+    if order_status:
+        query = query.filter(Order.status == order_status)
+    else:
+        query = query.filter(Order.status != "cancelled")
+    if date_from:
+        query = query.filter(Order.created_at >= date_from)
+    if date_to:
+        query = query.filter(Order.created_at < date_to)
     
-    completed_orders = db.query(func.count(Order.id)).filter(
-        Order.status == "completed"
-    ).scalar()
+    sort_column = {"revenue": revenue, "units": units, "orders": orders}[sort]
+    rows = query.group_by(OrderItem.product_id).order_by(sort_column.desc(), OrderItem.product_id).limit(limit).all()
     
-    return {
-        "totalProducts": total_products,
-        "totalOrders": total_orders,
-        "totalRevenue": total_revenue,
-        "totalUsers": total_users,
-        "pendingOrders": pending_orders,
-        "completedOrders": completed_orders
-    }
+    names = dict(db.query(Product.id, Product.name).filter(Product.id.in_([row[0] for row in rows])))
+    
+    return [
+        {
+            "productId": product_id,
+            "name": names.get(product_id),
+            "unitsSold": units_sold,
+            "revenue": product_revenue,
+            "orders": order_count
+        }
+        for product_id, units_sold, product_revenue, order_count in rows
+    ]
+
+@router.get("/api/admin/auth/cache-stats")
+def get_auth_cache_stats(current_user: User = Depends(require_admin)):
+    """Token verification cache hit rate"""
+    return principal_cache.stats()
 
 @router.get("/api/admin/orders/recent")
-async def get_recent_orders(
+def get_recent_orders(
     limit: int = 10,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -0,0 +1,44 @@
+"""
+Sales analytics routes - reports summed from the daily_sales rollups
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import List, Optional
+
+from database import get_db, User
+from auth import require_admin
+from analytics import sales_series, sales_breakdown
+
+router = APIRouter()
+
+@router.get("/api/admin/analytics/sales")
+def get_sales(
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    date_from: Optional[date] = Query(None, alias="dateFrom"),
+    date_to: Optional[date] = Query(None, alias="dateTo"),
+    status: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Orders, revenue, units and average order value per day, week (from
+    Monday) or month, for UTC days dateFrom <= day < dateTo. Cancelled
+    orders are left out unless listed in status (repeatable).
+    """
+    return sales_series(db, interval, date_from, date_to, status)
+
+@router.get("/api/admin/analytics/breakdown")
+def get_sales_breakdown(
+    by: str = Query("paymentMethod", pattern="^(paymentMethod|deliveryMethod|status)$"),
+    date_from: Optional[date] = Query(None, alias="dateFrom"),
+    date_to: Optional[date] = Query(None, alias="dateTo"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Orders, revenue, average order value and share of orders per payment
+    method, delivery method or status; methods also get completion and
+    cancellation rates.
+    """
+    return sales_breakdown(db, by, date_from, date_to)
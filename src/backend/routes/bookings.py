@@ -1,21 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 from datetime import datetime
-import random
-import string
 
 from database import get_db, Booking
-from schemas import BookingCreate, BookingResponse, BookingUpdate
+from schemas import BookingCreate, BookingResponse, BookingUpdate, BookingPage
 from auth import require_admin
+from stats import read_counters
+from pagination import keyset_page
+from exports import session_rows, export_response
+from numbering import booking_numbers
 
 router = APIRouter()
 
+BOOKING_EXPORT_FIELDS = [
+    "bookingNumber", "createdAt", "status", "name", "phone", "email",
+    "date", "time", "boutique", "message",
+]
+
 def generate_booking_number():
     """Generate unique booking number"""
-    timestamp = datetime.now().strftime("%Y%m%d")
-    random_part = ''.join(random.choices(string.digits, k=4))
-    return f"BK{timestamp}{random_part}"
+    return booking_numbers.next()
 
 # Public endpoint - create booking
 @router.post("/api/bookings", response_model=BookingResponse)
@@ -24,8 +29,6 @@ def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
     
     # Generate unique booking number
     booking_number = generate_booking_number()
-    while db.query(Booking).filter(Booking.booking_number == booking_number).first():
-        booking_number = generate_booking_number()
     
     db_booking = Booking(
         booking_number=booking_number,
@@ -46,23 +49,72 @@ def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
     return db_booking
 
 # Admin endpoints
-@router.get("/api/admin/bookings", response_model=List[BookingResponse])
+@router.get("/api/admin/bookings", response_model=Union[List[BookingResponse], BookingPage])
 def get_bookings(
     skip: int = 0,
     limit: int = 50,
     status: str = None,
+    cursor: Optional[str] = None,
+    with_total: bool = Query(False, alias="withTotal"),
     current_user: dict = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    """Get all bookings (admin only)"""
+    """
+    Get all bookings (admin only).
+    Passing `cursor` (empty for the first page) switches to keyset pagination
+    and returns {data, pagination: {limit, nextCursor[, total]}}.
+    """
     query = db.query(Booking)
     
     if status:
         query = query.filter(Booking.status == status)
     
-    bookings = query.order_by(Booking.created_at.desc()).offset(skip).limit(limit).all()
+    if cursor is not None:
+        bookings, next_cursor = keyset_page(query, Booking.created_at, Booking.id, cursor, limit)
+        pagination = {"limit": limit, "nextCursor": next_cursor}
+        if with_total:
+            pagination["total"] = query.count()
+        return {"data": bookings, "pagination": pagination}
+    
+    bookings = query.order_by(Booking.created_at.desc(), Booking.id.desc()).offset(skip).limit(limit).all()
     return bookings
 
+@router.get("/api/admin/bookings/export")
+def export_bookings(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="dateFrom"),
+    date_to: Optional[datetime] = Query(None, alias="dateTo"),
+    current_user: dict = Depends(require_admin)
+):
+    """Download bookings as CSV or NDJSON, oldest first, streamed (admin only)"""
+    def build_query(db: Session):
+        query = db.query(Booking)
+        if status:
+            query = query.filter(Booking.status == status)
+        if date_from:
+            query = query.filter(Booking.created_at >= date_from)
+        if date_to:
+            query = query.filter(Booking.created_at < date_to)
+        return query.order_by(Booking.created_at, Booking.id)
+    
+    records = (
+        {
+            "bookingNumber": booking.booking_number,
+            "createdAt": booking.created_at.isoformat() if booking.created_at else None,
+            "status": booking.status,
+            "name": booking.name,
+            "phone": booking.phone,
+            "email": booking.email,
+            "date": booking.date,
+            "time": booking.time,
+            "boutique": booking.boutique,
+            "message": booking.message,
+        }
+        for booking in session_rows(build_query)
+    )
+    return export_response(records, BOOKING_EXPORT_FIELDS, format, "bookings")
+
 @router.get("/api/admin/bookings/{booking_id}", response_model=BookingResponse)
 def get_booking(
     booking_id: int,
@@ -116,17 +168,13 @@ def get_bookings_stats(
     current_user: dict = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    """Get booking statistics (admin only)"""
-    total = db.query(Booking).count()
-    pending = db.query(Booking).filter(Booking.status == "pending").count()
-    confirmed = db.query(Booking).filter(Booking.status == "confirmed").count()
-    completed = db.query(Booking).filter(Booking.status == "completed").count()
-    cancelled = db.query(Booking).filter(Booking.status == "cancelled").count()
+    """Get booking statistics (admin only), from the counters kept by stats.py"""
+    counters = read_counters(db)
     
     return {
-        "total": total,
-        "pending": pending,
-        "confirmed": confirmed,
-        "completed": completed,
-        "cancelled": cancelled
+        "total": counters.count("bookings"),
+        "pending": counters.count("bookings:pending"),
+        "confirmed": counters.count("bookings:confirmed"),
+        "completed": counters.count("bookings:completed"),
+        "cancelled": counters.count("bookings:cancelled")
     }
\ No newline at end of file
@@ -1,28 +1,32 @@
 """
 Collections routes
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from database import get_db, Collection, Product
+from database import get_db, get_read_db, get_async_read_db, Collection, Product
 from schemas import CollectionCreate, CollectionUpdate
 from auth import require_admin
+from catalog_index import catalog_index
+from product_cache import product_cache, json_fragment_response
+from response_cache import content_cache
 
 router = APIRouter()
 
-# Public endpoints
-@router.get("/api/collections")
-async def get_collections(db: Session = Depends(get_db)):
-    """Get all active collections (public)"""
+def active_collections_payload(db: Session):
+    """Active collections response body"""
     collections = db.query(Collection).filter(Collection.active == True).all()
     
+    # Watch counts are maintained by the catalog index
+    catalog_index.ensure_loaded(db)
+    
     result = []
     for col in collections:
-        # Count products in collection
-        watch_count = db.query(Product).filter(
-            Product.collection == col.name
-        ).count()
+        watch_count = catalog_index.count("collection", col.name)
         
         result.append({
             "id": col.id,
@@ -37,8 +41,14 @@ async def get_collections(db: Session = Depends(get_db)):
     
     return result
 
+# Public endpoints
+@router.get("/api/collections")
+def get_collections(request: Request, db: Session = Depends(get_read_db)):
+    """Get all active collections (public, cached)"""
+    return content_cache.respond(request, "collections", lambda: active_collections_payload(db))
+
 @router.get("/api/collections/{collection_id}")
-async def get_collection(collection_id: str, db: Session = Depends(get_db)):
+def get_collection(collection_id: str, db: Session = Depends(get_read_db)):
     """Get collection by ID (public)"""
     collection = db.query(Collection).filter(Collection.id == collection_id).first()
     
@@ -46,9 +56,8 @@ async def get_collection(collection_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Collection not found")
     
     # Count products
-    watch_count = db.query(Product).filter(
-        Product.collection == collection.name
-    ).count()
+    catalog_index.ensure_loaded(db)
+    watch_count = catalog_index.count("collection", collection.name)
     
     return {
         "id": collection.id,
@@ -65,49 +74,48 @@ async def get_collection_products(
     collection_id: str,
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get products in collection (public)"""
-    collection = db.query(Collection).filter(Collection.id == collection_id).first()
+    collection = await db.scalar(select(Collection).where(Collection.id == collection_id))
     
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
     
     # Get products
-    query = db.query(Product).filter(Product.collection == collection.name)
+    query = select(Product).where(Product.collection == collection.name)
     
-    total = query.count()
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
     offset = (page - 1) * limit
-    products = query.offset(offset).limit(limit).all()
+    products = (await db.scalars(query.offset(offset).limit(limit))).all()
     
-    data = [product.to_dict() for product in products]
+    # Off the event loop: cache misses read the image manifests from disk
+    fragments = await run_in_threadpool(lambda: [product_cache.encode(product) for product in products])
     
-    return {
-        "data": data,
-        "pagination": {
+    return json_fragment_response(
+        fragments,
+        pagination={
             "page": page,
             "limit": limit,
             "total": total,
             "totalPages": (total + limit - 1) // limit
         }
-    }
+    )
 
 # Admin endpoints
 @router.get("/api/admin/collections")
-async def get_all_collections_admin(
+def get_all_collections_admin(
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Get all collections including inactive (admin)"""
-    collections = db.query(Collection).all()
+    # Watch counts for every collection in one grouped join
+    rows = db.query(Collection, func.count(Product.id)).outerjoin(
+        Product, Product.collection == Collection.name
+    ).group_by(Collection.id).order_by(Collection.created_at).all()
     
     result = []
-    for col in collections:
-        # Count products in collection
-        watch_count = db.query(Product).filter(
-            Product.collection == col.name
-        ).count()
-        
+    for col, watch_count in rows:
         result.append({
             "id": col.id,
             "name": col.name,
@@ -122,7 +130,7 @@ async def get_all_collections_admin(
     return result
 
 @router.get("/api/admin/collections/{collection_id}")
-async def get_collection_admin(
+def get_collection_admin(
     collection_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -150,7 +158,7 @@ async def get_collection_admin(
     }
 
 @router.post("/api/admin/collections")
-async def create_collection(
+def create_collection(
     collection: CollectionCreate,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -164,12 +172,13 @@ async def create_collection(
     db_collection = Collection(**collection.dict())
     db.add(db_collection)
     db.commit()
+    content_cache.bump("collections")
     db.refresh(db_collection)
     
     return {"message": "Collection created", "id": db_collection.id}
 
 @router.put("/api/admin/collections/{collection_id}")
-async def update_collection(
+def update_collection(
     collection_id: str,
     collection: CollectionUpdate,
     db: Session = Depends(get_db),
@@ -181,16 +190,30 @@ async def update_collection(
     if not db_collection:
         raise HTTPException(status_code=404, detail="Collection not found")
     
+    old_name = db_collection.name
     update_data = collection.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_collection, key, value)
     
+    # Products reference collections by name, move them along on rename
+    renamed = db_collection.name != old_name
+    if renamed:
+        db.query(Product).filter(Product.collection == old_name).update(
+            {"collection": db_collection.name}, synchronize_session=False
+        )
+    
     db.commit()
     
+    if renamed:
+        for product in db.query(Product).filter(Product.collection == db_collection.name).all():
+            catalog_index.upsert(product)
+        content_cache.bump("featured-watches")
+    content_cache.bump("collections")
+    
     return {"message": "Collection updated"}
 
 @router.delete("/api/admin/collections/{collection_id}")
-async def delete_collection(
+def delete_collection(
     collection_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -203,5 +226,6 @@ async def delete_collection(
     
     db.delete(db_collection)
     db.commit()
+    content_cache.bump("collections")
     
     return {"message": "Collection deleted"}
\ No newline at end of file
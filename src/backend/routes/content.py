@@ -1,14 +1,22 @@
 """
 Content management routes
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, update
+from datetime import datetime
 from pydantic import BaseModel
 import json
 
-from database import get_db, ContentHero, ContentPromoBanner, ContentHeritage, ContentSiteLogo, Product
+from database import (
+    get_db, get_read_db, ContentHero, ContentPromoBanner, ContentHeritage, ContentSiteLogo, Product, FeaturedProduct
+)
 from schemas import HeroContent, PromoBanner, HeritageSection
 from auth import require_admin
+from catalog_index import catalog_index
+from product_cache import product_cache
+from response_cache import content_cache
+from routes.collections import active_collections_payload
 
 router = APIRouter()
 
@@ -17,10 +25,9 @@ class SiteLogo(BaseModel):
     logoUrl: str
     logoDarkUrl: str | None = None
 
-# Public endpoints
-@router.get("/api/content/logo")
-async def get_site_logo(db: Session = Depends(get_db)):
-    """Get site logo (public)"""
+# Response bodies, shared by the cached public and the admin endpoints
+def logo_payload(db: Session):
+    """Site logo response body"""
     logo = db.query(ContentSiteLogo).filter(ContentSiteLogo.id == 1).first()
     
     if not logo:
@@ -34,9 +41,8 @@ async def get_site_logo(db: Session = Depends(get_db)):
         "logoDarkUrl": logo.logo_dark_url
     }
 
-@router.get("/api/content/hero")
-async def get_hero_content(db: Session = Depends(get_db)):
-    """Get hero content (public)"""
+def hero_payload(db: Session):
+    """Hero content response body"""
     hero = db.query(ContentHero).filter(ContentHero.id == 1).first()
     
     if not hero:
@@ -57,9 +63,8 @@ async def get_hero_content(db: Session = Depends(get_db)):
         "ctaLink": hero.cta_link
     }
 
-@router.get("/api/content/promo-banner")
-async def get_promo_banner(db: Session = Depends(get_db)):
-    """Get promo banner (public)"""
+def promo_banner_payload(db: Session):
+    """Promo banner response body"""
     banner = db.query(ContentPromoBanner).filter(ContentPromoBanner.id == 1).first()
     
     if not banner:
@@ -81,11 +86,11 @@ async def get_promo_banner(db: Session = Depends(get_db)):
         "highlightColor": banner.highlight_color
     }
 
-@router.get("/api/content/featured-watches")
-async def get_featured_watches(db: Session = Depends(get_db)):
-    """Get featured watches (public)"""
-    # Return featured products (is_featured = True)
-    products = db.query(Product).filter(Product.is_featured == True).limit(6).all()
+def featured_watches_payload(db: Session):
+    """Featured watches response body, in the order set by the admin"""
+    products = db.query(Product.id, Product.name, Product.collection, Product.price, Product.image).join(
+        FeaturedProduct, FeaturedProduct.product_id == Product.id
+    ).order_by(FeaturedProduct.position).limit(6).all()
     
     result = []
     for product in products:
@@ -100,9 +105,8 @@ async def get_featured_watches(db: Session = Depends(get_db)):
     
     return result
 
-@router.get("/api/content/heritage")
-async def get_heritage_section(db: Session = Depends(get_db)):
-    """Get heritage section (public)"""
+def heritage_payload(db: Session):
+    """Heritage section response body"""
     heritage = db.query(ContentHeritage).filter(ContentHeritage.id == 1).first()
     
     if not heritage:
@@ -124,28 +128,55 @@ async def get_heritage_section(db: Session = Depends(get_db)):
         "yearsText": heritage.years_text
     }
 
+# Public endpoints
+@router.get("/api/content/logo")
+def get_site_logo(request: Request, db: Session = Depends(get_read_db)):
+    """Get site logo (public, cached)"""
+    return content_cache.respond(request, "logo", lambda: logo_payload(db))
+
+@router.get("/api/content/hero")
+def get_hero_content(request: Request, db: Session = Depends(get_read_db)):
+    """Get hero content (public, cached)"""
+    return content_cache.respond(request, "hero", lambda: hero_payload(db))
+
+@router.get("/api/content/promo-banner")
+def get_promo_banner(request: Request, db: Session = Depends(get_read_db)):
+    """Get promo banner (public, cached)"""
+    return content_cache.respond(request, "promo-banner", lambda: promo_banner_payload(db))
+
+@router.get("/api/content/featured-watches")
+def get_featured_watches(request: Request, db: Session = Depends(get_read_db)):
+    """Get featured watches (public, cached)"""
+    return content_cache.respond(request, "featured-watches", lambda: featured_watches_payload(db))
+
+@router.get("/api/content/heritage")
+def get_heritage_section(request: Request, db: Session = Depends(get_read_db)):
+    """Get heritage section (public, cached)"""
+    return content_cache.respond(request, "heritage", lambda: heritage_payload(db))
+
+@router.get("/api/content/bootstrap")
+def get_home_bootstrap(request: Request, db: Session = Depends(get_read_db)):
+    """Everything the home page needs in one response (public, cached)"""
+    return content_cache.respond_combined(request, {
+        "logo": ("logo", lambda: logo_payload(db)),
+        "hero": ("hero", lambda: hero_payload(db)),
+        "promoBanner": ("promo-banner", lambda: promo_banner_payload(db)),
+        "heritage": ("heritage", lambda: heritage_payload(db)),
+        "featuredWatches": ("featured-watches", lambda: featured_watches_payload(db)),
+        "collections": ("collections", lambda: active_collections_payload(db)),
+    })
+
 # Admin endpoints
 @router.get("/api/admin/content/logo")
-async def get_site_logo_admin(
+def get_site_logo_admin(
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Get site logo (admin)"""
-    logo = db.query(ContentSiteLogo).filter(ContentSiteLogo.id == 1).first()
-    
-    if not logo:
-        return {
-            "logoUrl": "https://via.placeholder.com/150x50?text=ORIENT",
-            "logoDarkUrl": None
-        }
-    
-    return {
-        "logoUrl": logo.logo_url,
-        "logoDarkUrl": logo.logo_dark_url
-    }
+    return logo_payload(db)
 
 @router.put("/api/admin/content/logo")
-async def update_site_logo(
+def update_site_logo(
     logo: SiteLogo,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -161,37 +192,20 @@ async def update_site_logo(
     db_logo.logo_dark_url = logo.logoDarkUrl
     
     db.commit()
+    content_cache.bump("logo")
     
     return {"message": "Logo updated"}
 
 @router.get("/api/admin/content/hero")
-async def get_hero_content_admin(
+def get_hero_content_admin(
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Get hero content (admin)"""
-    hero = db.query(ContentHero).filter(ContentHero.id == 1).first()
-    
-    if not hero:
-        # Return default
-        return {
-            "title": "НАЙДИТЕ\nИДЕАЛЬНЫЕ\nЧАСЫ.",
-            "subtitle": "Японское мастерство и точность в каждой детали",
-            "image": "https://images.unsplash.com/photo-1587836374828-4dbafa94cf0e?w=800&q=80",
-            "ctaText": "Смотреть коллекцию",
-            "ctaLink": "/catalog"
-        }
-    
-    return {
-        "title": hero.title,
-        "subtitle": hero.subtitle,
-        "image": hero.image,
-        "ctaText": hero.cta_text,
-        "ctaLink": hero.cta_link
-    }
+    return hero_payload(db)
 
 @router.put("/api/admin/content/hero")
-async def update_hero_content(
+def update_hero_content(
     content: HeroContent,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -210,38 +224,20 @@ async def update_hero_content(
     hero.cta_link = content.ctaLink
     
     db.commit()
+    content_cache.bump("hero")
     
     return {"message": "Hero content updated"}
 
 @router.get("/api/admin/content/promo-banner")
-async def get_promo_banner_admin(
+def get_promo_banner_admin(
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Get promo banner (admin)"""
-    banner = db.query(ContentPromoBanner).filter(ContentPromoBanner.id == 1).first()
-    
-    if not banner:
-        return {
-            "text": "СКИДКА 15% НА ВСЕ ЧАСЫ С КОДОМ",
-            "code": "PRE2025",
-            "active": True,
-            "backgroundColor": "#000000",
-            "textColor": "#FFFFFF",
-            "highlightColor": "#C8102E"
-        }
-    
-    return {
-        "text": banner.text,
-        "code": banner.code,
-        "active": banner.active,
-        "backgroundColor": banner.background_color,
-        "textColor": banner.text_color,
-        "highlightColor": banner.highlight_color
-    }
+    return promo_banner_payload(db)
 
 @router.put("/api/admin/content/promo-banner")
-async def update_promo_banner(
+def update_promo_banner(
     banner: PromoBanner,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -261,80 +257,67 @@ async def update_promo_banner(
     db_banner.highlight_color = banner.highlightColor
     
     db.commit()
+    content_cache.bump("promo-banner")
     
     return {"message": "Promo banner updated"}
 
 @router.get("/api/admin/content/featured-watches")
-async def get_featured_watches_admin(
+def get_featured_watches_admin(
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Get featured watches (admin)"""
-    # Return featured products (is_featured = True)
-    products = db.query(Product).filter(Product.is_featured == True).limit(6).all()
-    
-    result = []
-    for product in products:
-        result.append({
-            "id": str(product.id),
-            "name": product.name,
-            "collection": product.collection,
-            "price": product.price,
-            "image": product.image,
-            "isNew": True
-        })
-    
-    return result
+    return featured_watches_payload(db)
 
 @router.put("/api/admin/content/featured-watches")
-async def update_featured_watches(
+def update_featured_watches(
     product_ids: list[str],
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
-    """Update featured watches - mark products as featured (admin)"""
-    # Unmark all products
-    db.query(Product).update({"is_featured": False})
-    
-    # Mark selected products as featured
-    for product_id in product_ids:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if product:
-            product.is_featured = True
+    """Update featured watches - products in display order (admin)"""
+    # Unknown ids are skipped, repeats keep their first position
+    requested = list(dict.fromkeys(product_ids))
+    known = {product_id for (product_id,) in db.query(Product.id).filter(Product.id.in_(requested))}
+    featured = [product_id for product_id in requested if product_id in known]
+    
+    db.execute(delete(FeaturedProduct))
+    if featured:
+        db.execute(insert(FeaturedProduct), [
+            {"position": position, "product_id": product_id}
+            for position, product_id in enumerate(featured)
+        ])
+    
+    # Flip is_featured only where it changes, in one UPDATE
+    flag = Product.id.in_(featured)
+    changes = func.coalesce(Product.is_featured, False) != flag
+    changed = [product_id for (product_id,) in db.query(Product.id).filter(changes)]
+    if changed:
+        db.execute(
+            update(Product).where(Product.id.in_(changed))
+            .values(is_featured=Product.id.in_(featured), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
     
     db.commit()
     
+    for product in db.query(Product).filter(Product.id.in_(changed)):
+        product_cache.invalidate(product.id)
+        catalog_index.upsert(product)
+    content_cache.bump("featured-watches")
+    
     return {"message": "Featured watches updated"}
 
 @router.get("/api/admin/content/heritage")
-async def get_heritage_section_admin(
+def get_heritage_section_admin(
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Get heritage section (admin)"""
-    heritage = db.query(ContentHeritage).filter(ContentHeritage.id == 1).first()
-    
-    if not heritage:
-        return {
-            "title": "75 лет\nмастерства",
-            "subtitle": "С 1950 года",
-            "description": "Orient создает механические часы высочайшего качества, объединяя традиционное японское мастерство с современными технологиями.",
-            "ctaText": "Узнать историю",
-            "ctaLink": "/history",
-            "yearsText": "75"
-        }
-    
-    return {
-        "title": heritage.title,
-        "subtitle": heritage.subtitle,
-        "description": heritage.description,
-        "ctaText": heritage.cta_text,
-        "ctaLink": heritage.cta_link,
-        "yearsText": heritage.years_text
-    }
+    return heritage_payload(db)
 
 @router.put("/api/admin/content/heritage")
-async def update_heritage_section(
+def update_heritage_section(
     heritage: HeritageSection,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -354,5 +337,6 @@ async def update_heritage_section(
     db_heritage.years_text = heritage.yearsText
     
     db.commit()
+    content_cache.bump("heritage")
     
     return {"message": "Heritage section updated"}
\ No newline at end of file
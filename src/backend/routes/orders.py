@@ -2,25 +2,155 @@
 Orders routes
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, insert, update
 from sqlalchemy.orm import Session
-from typing import Optional
-import json
+from typing import Iterator, Optional
 from datetime import datetime
+import json
+import os
 
-from database import get_db, Order
+from database import get_db, get_read_db, write_lock, Order, OrderItem, Product
 from schemas import OrderCreate, OrderStatusUpdate
 from auth import require_admin
+from pagination import keyset_page
+from numbering import order_numbers
+from catalog_index import catalog_index
+from product_cache import product_cache
+from exports import session_rows, export_response
 
 router = APIRouter()
 
+# Client prices may differ from ours by rounding only
+PRICE_TOLERANCE = 0.01
+
+# Shipping per delivery method, same rates as the cart (pages/Cart.tsx);
+# standard delivery is free above FREE_SHIPPING_THRESHOLD
+SHIPPING_RATES = {
+    "pickup": 0.0,
+    "standard": float(os.getenv("SHIPPING_STANDARD_COST", "500")),
+    "express": float(os.getenv("SHIPPING_EXPRESS_COST", "1500")),
+}
+FREE_SHIPPING_THRESHOLD = float(os.getenv("FREE_SHIPPING_THRESHOLD", "50000"))
+
+# Export: one row per order line, order and customer fields repeated on each
+ORDER_EXPORT_FIELDS = [
+    "orderNumber", "createdAt", "status", "paymentMethod", "deliveryMethod",
+    "customerName", "customerEmail", "customerPhone",
+    "address", "city", "postalCode", "country", "notes",
+    "subtotal", "shipping", "total",
+    "line", "productId", "quantity", "price", "lineTotal",
+]
+
 def generate_order_number():
     """Generate unique order number"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    return f"ORD-{timestamp}"
+    return order_numbers.next()
+
+def adjust_stock(db: Session, quantities: dict, sign: int) -> int:
+    """
+    Take (sign=-1) or return (sign=1) stock for {product_id: quantity} in
+    one UPDATE. Taking is conditional on stock_quantity >= quantity for
+    every line; returns the number of products updated.
+    """
+    quantity = case(quantities, value=Product.id)
+    remaining = Product.stock_quantity + sign * quantity
+    
+    statement = update(Product).where(Product.id.in_(list(quantities))).values(
+        stock_quantity=remaining,
+        in_stock=remaining > 0,
+        updated_at=datetime.utcnow()
+    )
+    if sign < 0:
+        statement = statement.where(Product.stock_quantity >= quantity)
+    
+    return db.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+def reserve_stock(db: Session, quantities: dict):
+    """Take stock for every line or none; rolls back and raises 409/400 on shortage"""
+    if adjust_stock(db, quantities, -1) == len(quantities):
+        return
+    
+    db.rollback()
+    available = dict(db.query(Product.id, Product.stock_quantity).filter(Product.id.in_(list(quantities))))
+    missing = [product_id for product_id in quantities if product_id not in available]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown products: {', '.join(missing)}")
+    
+    short = [
+        f"{product_id} (available: {available[product_id] or 0})"
+        for product_id, quantity in quantities.items()
+        if (available[product_id] or 0) < quantity
+    ]
+    raise HTTPException(status_code=409, detail=f"Not enough stock: {', '.join(short)}")
+
+def refresh_stock(db: Session, product_ids: list):
+    """Re-index products whose stock changed (call after commit)"""
+    for product in db.query(Product).filter(Product.id.in_(product_ids)):
+        product_cache.invalidate(product.id)
+        catalog_index.upsert(product)
+
+def shipping_cost(delivery_method: str, subtotal: float) -> float:
+    """Server-side shipping for an order, 400 for unknown delivery methods"""
+    if delivery_method not in SHIPPING_RATES:
+        raise HTTPException(status_code=400, detail=f"Unknown delivery method: {delivery_method}")
+    if delivery_method == "standard" and subtotal > FREE_SHIPPING_THRESHOLD:
+        return 0.0
+    return SHIPPING_RATES[delivery_method]
+
+def line_quantities(lines) -> dict:
+    """{product_id: total quantity} from (product_id, quantity) pairs; repeated products are summed"""
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
 
 @router.post("/api/orders")
-async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
-    """Create new order (public endpoint)"""
+def create_order(
+    order: OrderCreate,
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    """
+    Create new order (public endpoint).
+    Prices and shipping are checked against the catalog and rate table and
+    the stored totals computed server-side; stock for all lines is then taken in one conditional UPDATE.
+    """
+    if not order.items:
+        raise HTTPException(status_code=400, detail="Order has no items")
+    
+    quantities = line_quantities((item.productId, item.quantity) for item in order.items)
+    
+    # Validation reads stay outside the write transaction, and hopeless
+    # orders are turned away without queueing for the write lock
+    catalog = {
+        product_id: (price, stock)
+        for product_id, price, stock in read_db.query(Product.id, Product.price, Product.stock_quantity)
+        .filter(Product.id.in_(list(quantities)))
+    }
+    missing = [product_id for product_id in quantities if product_id not in catalog]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown products: {', '.join(missing)}")
+    
+    prices = {product_id: price for product_id, (price, _) in catalog.items()}
+    changed = [item.productId for item in order.items if abs(item.price - prices[item.productId]) > PRICE_TOLERANCE]
+    if changed:
+        raise HTTPException(status_code=409, detail=f"Prices have changed: {', '.join(dict.fromkeys(changed))}")
+    
+    subtotal = sum(prices[product_id] * quantity for product_id, quantity in quantities.items())
+    shipping = shipping_cost(order.deliveryMethod, subtotal)
+    if abs(order.shipping - shipping) > PRICE_TOLERANCE:
+        raise HTTPException(status_code=400, detail="Shipping cost does not match the delivery method")
+    total = subtotal + shipping
+    if abs(order.subtotal - subtotal) > PRICE_TOLERANCE or abs(order.total - total) > PRICE_TOLERANCE:
+        raise HTTPException(status_code=400, detail="Order totals do not match item prices")
+    
+    short = [
+        f"{product_id} (available: {catalog[product_id][1] or 0})"
+        for product_id, quantity in quantities.items()
+        if (catalog[product_id][1] or 0) < quantity
+    ]
+    if short:
+        raise HTTPException(status_code=409, detail=f"Not enough stock: {', '.join(short)}")
+    
     # Generate order number
     order_number = generate_order_number()
     
@@ -29,43 +159,78 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         order_number=order_number,
         customer_data=json.dumps(order.customer.dict()),
         items=json.dumps([item.dict() for item in order.items]),
-        subtotal=order.subtotal,
-        shipping=order.shipping,
-        total=order.total,
+        subtotal=subtotal,
+        shipping=shipping,
+        total=total,
         payment_method=order.paymentMethod,
         delivery_method=order.deliveryMethod,
         delivery_address=json.dumps(order.deliveryAddress.dict()) if order.deliveryAddress else None,
         notes=order.notes,
-        status="pending"
+        status="pending",
+        stock_reserved=True
     )
     
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    with write_lock:
+        # Authoritative check; the first statement, so the write lock is taken up front
+        reserve_stock(db, quantities)
+        
+        db.add(db_order)
+        db.flush()
+        order_id = db_order.id
+        
+        # Line items in one executemany, same transaction as the order
+        db.execute(insert(OrderItem), [
+            {
+                "order_id": order_id,
+                "product_id": item.productId,
+                "quantity": item.quantity,
+                "price": prices[item.productId],
+            }
+            for item in order.items
+        ])
+        db.commit()
+    
+    refresh_stock(db, list(quantities))
     
     return {
         "message": "Order created successfully",
         "orderNumber": order_number,
-        "id": db_order.id
+        "id": order_id
     }
 
 @router.get("/api/admin/orders")
-async def get_orders(
+def get_orders(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = None,
+    product_id: Optional[str] = Query(None, alias="productId"),
+    cursor: Optional[str] = None,
+    with_total: bool = Query(False, alias="withTotal"),
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
-    """Get all orders"""
+    """
+    Get all orders, newest first, optionally only those containing productId.
+    Passing `cursor` (empty for the first page) switches to keyset pagination:
+    follow `nextCursor`, and `total` is only counted when withTotal=true.
+    """
     query = db.query(Order)
     
     if status:
         query = query.filter(Order.status == status)
     
-    total = query.count()
-    offset = (page - 1) * limit
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    if product_id:
+        query = query.filter(Order.id.in_(
+            db.query(OrderItem.order_id).filter(OrderItem.product_id == product_id)
+        ))
+    
+    if cursor is not None:
+        total = query.count() if with_total else None
+        orders, next_cursor = keyset_page(query, Order.created_at, Order.id, cursor, limit)
+    else:
+        total = query.count()
+        offset = (page - 1) * limit
+        orders = query.order_by(Order.created_at.desc(), Order.id.desc()).offset(offset).limit(limit).all()
     
     data = []
     for order in orders:
@@ -86,6 +251,12 @@ async def get_orders(
             "createdAt": order.created_at.isoformat() if order.created_at else None
         })
     
+    if cursor is not None:
+        pagination = {"limit": limit, "nextCursor": next_cursor}
+        if total is not None:
+            pagination["total"] = total
+        return {"data": data, "pagination": pagination}
+    
     return {
         "data": data,
         "pagination": {
@@ -96,8 +267,78 @@ async def get_orders(
         }
     }
 
+def load_json(value, default):
+    try:
+        return json.loads(value) if value else default
+    except ValueError:
+        return default
+
+def order_export_records(rows) -> Iterator[dict]:
+    """Flatten orders into ORDER_EXPORT_FIELDS records, one per line item"""
+    for row in rows:
+        customer = load_json(row.customer_data, {})
+        address = load_json(row.delivery_address, None) or {}
+        order = {
+            "orderNumber": row.order_number,
+            "createdAt": row.created_at.isoformat() if row.created_at else None,
+            "status": row.status,
+            "paymentMethod": row.payment_method,
+            "deliveryMethod": row.delivery_method,
+            "customerName": customer.get("fullName"),
+            "customerEmail": customer.get("email"),
+            "customerPhone": customer.get("phone"),
+            "address": address.get("address"),
+            "city": address.get("city"),
+            "postalCode": address.get("postalCode"),
+            "country": address.get("country"),
+            "notes": row.notes,
+            "subtotal": row.subtotal,
+            "shipping": row.shipping,
+            "total": row.total,
+        }
+        
+        items = [item for item in load_json(row.items, []) if isinstance(item, dict)]
+        for line, item in enumerate(items or [{}], 1):
+            quantity, price = item.get("quantity"), item.get("price")
+            yield {
+                **order,
+                "line": line if item else None,
+                "productId": item.get("productId"),
+                "quantity": quantity,
+                "price": price,
+                "lineTotal": quantity * price if quantity is not None and price is not None else None,
+            }
+
+@router.get("/api/admin/orders/export")
+def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="dateFrom"),
+    date_to: Optional[datetime] = Query(None, alias="dateTo"),
+    current_user = Depends(require_admin)
+):
+    """
+    Download orders as CSV or NDJSON, oldest first, one row per order line.
+    Streamed from the database, so any date range uses the same memory.
+    """
+    def build_query(db: Session):
+        query = db.query(
+            Order.order_number, Order.created_at, Order.status, Order.payment_method, Order.delivery_method,
+            Order.customer_data, Order.delivery_address, Order.notes, Order.items,
+            Order.subtotal, Order.shipping, Order.total
+        )
+        if status:
+            query = query.filter(Order.status == status)
+        if date_from:
+            query = query.filter(Order.created_at >= date_from)
+        if date_to:
+            query = query.filter(Order.created_at < date_to)
+        return query.order_by(Order.created_at, Order.id)
+    
+    return export_response(order_export_records(session_rows(build_query)), ORDER_EXPORT_FIELDS, format, "orders")
+
 @router.get("/api/admin/orders/{order_id}")
-async def get_order(
+def get_order(
     order_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -130,23 +371,43 @@ async def get_order(
     }
 
 @router.put("/api/admin/orders/{order_id}/status")
-async def update_order_status(
+def update_order_status(
     order_id: str,
     status_update: OrderStatusUpdate,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """Update order status"""
-    order = db.query(Order).filter(Order.order_number == order_id).first()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    order.status = status_update.status
-    if status_update.note:
-        order.notes = status_update.note
+    # Same lock as create_order, and the status is read under it, so two
+    # changes can't both return (or take) an order's stock
+    with write_lock:
+        order = db.query(Order).filter(Order.order_number == order_id).first()
+        
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        
+        # Cancelling returns the stock, reopening takes it again; orders
+        # from before stock was reserved leave it alone
+        cancelled = "cancelled"
+        quantities = {}
+        if order.stock_reserved and (order.status == cancelled) != (status_update.status == cancelled):
+            quantities = line_quantities(
+                db.query(OrderItem.product_id, OrderItem.quantity).filter(OrderItem.order_id == order.id)
+            )
+        if quantities:
+            if status_update.status == cancelled:
+                adjust_stock(db, quantities, 1)
+            else:
+                reserve_stock(db, quantities)
+        
+        order.status = status_update.status
+        if status_update.note:
+            order.notes = status_update.note
+        
+        db.commit()
     
-    db.commit()
+    if quantities:
+        refresh_stock(db, list(quantities))
     
     return {
         "message": "Order status updated",
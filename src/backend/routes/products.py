@@ -1,21 +1,32 @@
 """
 Products routes - CRUD operations
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import json
+import tempfile
 
-from database import get_db, Product, FilterOption
+from database import get_db, get_read_db, get_async_read_db, Product, FeaturedProduct, FilterOption
 from schemas import ProductCreate, ProductUpdate
 from auth import require_admin
+from catalog_index import catalog_index
+from search import search_product_ids, search_condition, suggest_products
+from pagination import encode_cursor, decode_cursor
+from product_cache import product_cache, json_fragment_response
+from response_cache import content_cache
+from catalog_io import (
+    EXPORT_FIELDS, IMPORT_MAX_SIZE, product_slug, unique_slug, product_values, import_products, export_records
+)
+from exports import export_response
 
 router = APIRouter()
 
 # Public endpoints
 @router.get("/api/products")
-async def get_products(
+def get_products(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
@@ -26,117 +37,152 @@ async def get_products(
     case_material: Optional[str] = Query(None, alias="caseMaterial"),
     dial_color: Optional[str] = Query(None, alias="dialColor"),
     water_resistance: Optional[str] = Query(None, alias="waterResistance"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """Get all products with filters and pagination (public)"""
-    query = db.query(Product)
-    
-    # Filters
-    if search:
-        query = query.filter(Product.name.contains(search))
-    
-    if collection:
-        query = query.filter(Product.collection == collection)
-    
-    if min_price is not None:
-        query = query.filter(Product.price >= min_price)
-    
-    if max_price is not None:
-        query = query.filter(Product.price <= max_price)
-    
-    if movement:
-        query = query.filter(Product.movement == movement)
-    
-    if case_material:
-        query = query.filter(Product.case_material == case_material)
-    
-    if dial_color:
-        query = query.filter(Product.dial_color == dial_color)
-    
-    if water_resistance:
-        query = query.filter(Product.water_resistance == water_resistance)
-    
-    # Count total
-    total = query.count()
-    
-    # Pagination
-    offset = (page - 1) * limit
-    products = query.offset(offset).limit(limit).all()
-    
-    # Convert to dict
-    data = [product.to_dict() for product in products]
-    
-    return {
-        "data": data,
-        "pagination": {
+    """
+    Get all products with filters and pagination (public).
+    `cursor` (from a previous pagination.nextCursor) continues after the
+    last product served instead of using `page`.
+    """
+    catalog_index.ensure_loaded(db)
+    
+    # Full-text search hits, best match first
+    ranked_ids = search_product_ids(db, search) if search else None
+    
+    # Filters, count and page slice are answered by the in-memory index
+    matches = catalog_index.match(
+        filters={
+            "collection": collection,
+            "movement": movement,
+            "case_material": case_material,
+            "dial_color": dial_color,
+            "water_resistance": water_resistance,
+        },
+        min_price=min_price,
+        max_price=max_price,
+        within=catalog_index.bits_for(ranked_ids) if ranked_ids is not None else None,
+    )
+    total = matches.bit_count()
+    
+    # Pagination, one extra id tells whether another page exists
+    after = decode_cursor(cursor, str)[0] if cursor else None
+    offset = 0 if cursor else (page - 1) * limit
+    try:
+        if ranked_ids is not None:
+            page_ids = catalog_index.ranked_page(matches, ranked_ids, offset, limit + 1, after=after)
+        else:
+            page_ids = catalog_index.page(matches, offset, limit + 1, after=after)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    next_cursor = None
+    if len(page_ids) > limit:
+        page_ids = page_ids[:limit]
+        next_cursor = encode_cursor(page_ids[-1])
+    
+    # Serialized products come from the cache, only misses are loaded
+    fragments = {}
+    for product_id, updated_at in catalog_index.versions(page_ids):
+        cached = product_cache.lookup(product_id, updated_at)
+        if cached is not None:
+            fragments[product_id] = cached
+    
+    missing = [pid for pid in page_ids if pid not in fragments]
+    if missing:
+        for product in db.query(Product).filter(Product.id.in_(missing)).all():
+            fragments[product.id] = product_cache.encode(product)
+    
+    return json_fragment_response(
+        [fragments[pid] for pid in page_ids if pid in fragments],
+        pagination={
             "page": page,
             "limit": limit,
             "total": total,
-            "totalPages": (total + limit - 1) // limit
+            "totalPages": (total + limit - 1) // limit,
+            "nextCursor": next_cursor
         }
-    }
+    )
+
+def facet_options(counts: dict, humanize: bool = True):
+    """Filter sidebar options for one facet, sorted by value"""
+    return [
+        {
+            "label": value.replace("_", " ").title() if humanize else value,
+            "value": value,
+            "count": count
+        }
+        for value, count in sorted(counts.items())
+    ]
 
 @router.get("/api/products/filters")
-async def get_available_filters(db: Session = Depends(get_db)):
-    """Get available filter options based on existing products"""
-    # Get unique values from products
-    movements = db.query(Product.movement).filter(Product.movement.isnot(None)).distinct().all()
-    materials = db.query(Product.case_material).filter(Product.case_material.isnot(None)).distinct().all()
-    colors = db.query(Product.dial_color).filter(Product.dial_color.isnot(None)).distinct().all()
-    water_res = db.query(Product.water_resistance).filter(Product.water_resistance.isnot(None)).distinct().all()
-    
-    # Count products for each filter
-    def count_products(field, value):
-        return db.query(func.count(Product.id)).filter(field == value).scalar()
+def get_available_filters(
+    mode: str = Query("all", pattern="^(all|selection)$"),
+    search: Optional[str] = None,
+    collection: Optional[str] = None,
+    min_price: Optional[float] = Query(None, alias="minPrice"),
+    max_price: Optional[float] = Query(None, alias="maxPrice"),
+    movement: Optional[str] = None,
+    case_material: Optional[str] = Query(None, alias="caseMaterial"),
+    dial_color: Optional[str] = Query(None, alias="dialColor"),
+    water_resistance: Optional[str] = Query(None, alias="waterResistance"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get available filter options based on existing products.
+    mode=selection counts each option within the current filter selection
+    (same query parameters as /api/products).
+    """
+    catalog_index.ensure_loaded(db)
+    
+    if mode == "selection":
+        ranked_ids = search_product_ids(db, search) if search else None
+        counts = catalog_index.facet_counts(
+            filters={
+                "collection": collection,
+                "movement": movement,
+                "case_material": case_material,
+                "dial_color": dial_color,
+                "water_resistance": water_resistance,
+            },
+            min_price=min_price,
+            max_price=max_price,
+            within=catalog_index.bits_for(ranked_ids) if ranked_ids is not None else None,
+        )
+    else:
+        counts = catalog_index.facet_counts()
     
     return {
-        "movements": [
-            {
-                "label": m[0].replace("_", " ").title(),
-                "value": m[0],
-                "count": count_products(Product.movement, m[0])
-            }
-            for m in movements if m[0]
-        ],
-        "caseMaterials": [
-            {
-                "label": m[0].replace("_", " ").title(),
-                "value": m[0],
-                "count": count_products(Product.case_material, m[0])
-            }
-            for m in materials if m[0]
-        ],
-        "dialColors": [
-            {
-                "label": c[0].replace("_", " ").title(),
-                "value": c[0],
-                "count": count_products(Product.dial_color, c[0])
-            }
-            for c in colors if c[0]
-        ],
-        "waterResistance": [
-            {
-                "label": w[0],
-                "value": w[0],
-                "count": count_products(Product.water_resistance, w[0])
-            }
-            for w in water_res if w[0]
-        ]
+        "movements": facet_options(counts["movement"]),
+        "caseMaterials": facet_options(counts["case_material"]),
+        "dialColors": facet_options(counts["dial_color"]),
+        "waterResistance": facet_options(counts["water_resistance"], humanize=False)
     }
 
+@router.get("/api/products/suggest")
+def suggest(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    db: Session = Depends(get_read_db)
+):
+    """Autocomplete product names and SKUs by prefix (public)"""
+    return suggest_products(db, q, limit)
+
 @router.get("/api/products/{product_id}")
-async def get_product(product_id: str, db: Session = Depends(get_db)):
+async def get_product(product_id: str, db: AsyncSession = Depends(get_async_read_db)):
     """Get product by ID (public)"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return product.to_dict()
+    # Off the event loop: a cache miss reads the image manifests from disk
+    content = await run_in_threadpool(product_cache.encode, product)
+    return Response(content=content, media_type="application/json")
 
 # Admin endpoints
 @router.get("/api/admin/products")
-async def get_all_products_admin(
+def get_all_products_admin(
     page: int = Query(1, ge=1),
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = None,
@@ -149,7 +195,7 @@ async def get_all_products_admin(
     
     # Filters
     if search:
-        query = query.filter(Product.name.contains(search))
+        query = query.filter(search_condition(db, search))
     
     if collection:
         query = query.filter(Product.collection == collection)
@@ -161,21 +207,66 @@ async def get_all_products_admin(
     offset = (page - 1) * limit
     products = query.offset(offset).limit(limit).all()
     
-    # Convert to dict
-    data = [product.to_dict() for product in products]
-    
-    return {
-        "data": data,
-        "pagination": {
+    return json_fragment_response(
+        [product_cache.encode(product) for product in products],
+        pagination={
             "page": page,
             "limit": limit,
             "total": total,
             "totalPages": (total + limit - 1) // limit
         }
-    }
+    )
+
+def import_format(request: Request, format: Optional[str]) -> str:
+    """Format from ?format= or the Content-Type of the body"""
+    if format:
+        return format
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+        return "ndjson"
+    raise HTTPException(status_code=400, detail="Unknown import format, pass format=csv or format=ndjson")
+
+@router.post("/api/admin/products/import")
+async def import_products_bulk(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_user = Depends(require_admin)
+):
+    """
+    Create or update products from a CSV or NDJSON body (admin).
+    Rows are validated like POST /api/admin/products and matched by SKU;
+    returns counts and a status per row, failed rows do not stop the import.
+    """
+    file_format = import_format(request, format)
+    
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > IMPORT_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Import too large. Max size: {IMPORT_MAX_SIZE / 1024 / 1024}MB")
+    
+    # Spooled to disk as it arrives, parsing then streams from the file
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > IMPORT_MAX_SIZE:
+                raise HTTPException(status_code=413, detail=f"Import too large. Max size: {IMPORT_MAX_SIZE / 1024 / 1024}MB")
+            await run_in_threadpool(spool.write, chunk)
+        spool.seek(0)
+        
+        return await run_in_threadpool(import_products, spool, file_format)
+
+@router.get("/api/admin/products/export")
+def export_products_bulk(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    current_user = Depends(require_admin)
+):
+    """Download all products as CSV or NDJSON (admin), streamed from the database"""
+    return export_response(export_records(), EXPORT_FIELDS, format, "products")
 
 @router.get("/api/admin/products/{product_id}")
-async def get_product_admin(
+def get_product_admin(
     product_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -189,7 +280,7 @@ async def get_product_admin(
     return product.to_dict()
 
 @router.post("/api/admin/products")
-async def create_product(
+def create_product(
     product: ProductCreate,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -202,43 +293,28 @@ async def create_product(
             raise HTTPException(status_code=409, detail="SKU already exists")
     
     # Generate ID from name
-    product_id = product.name.lower().replace(" ", "-").replace("&", "and")
+    product_id = product_slug(product.name)
     
     # Check if ID exists
     existing_id = db.query(Product).filter(Product.id == product_id).first()
     if existing_id:
         # Add random suffix
-        import uuid
-        product_id = f"{product_id}-{str(uuid.uuid4())[:8]}"
+        product_id = unique_slug(product_id)
     
     # Create product
-    db_product = Product(
-        id=product_id,
-        name=product.name,
-        collection=product.collection,
-        price=product.price,
-        image=product.image,
-        images=json.dumps(product.images),
-        description=product.description,
-        features=json.dumps(product.features),
-        specs=json.dumps(product.specs),
-        in_stock=product.inStock,
-        stock_quantity=product.stockQuantity,
-        sku=product.sku,
-        movement=getattr(product, 'movement', None),
-        case_material=getattr(product, 'caseMaterial', None),
-        dial_color=getattr(product, 'dialColor', None),
-        water_resistance=getattr(product, 'waterResistance', None),
-    )
+    db_product = Product(id=product_id, **product_values(product))
     
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    catalog_index.upsert(db_product)
+    product_cache.invalidate(db_product.id)
+    content_cache.bump("featured-watches", "collections")
     
     return db_product.to_dict()
 
 @router.put("/api/admin/products/{product_id}")
-async def update_product(
+def update_product(
     product_id: str,
     product: ProductUpdate,
     db: Session = Depends(get_db),
@@ -275,11 +351,14 @@ async def update_product(
     
     db.commit()
     db.refresh(db_product)
+    catalog_index.upsert(db_product)
+    product_cache.invalidate(db_product.id)
+    content_cache.bump("featured-watches", "collections")
     
     return db_product.to_dict()
 
 @router.delete("/api/admin/products/{product_id}")
-async def delete_product(
+def delete_product(
     product_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(require_admin)
@@ -291,6 +370,10 @@ async def delete_product(
         raise HTTPException(status_code=404, detail="Product not found")
     
     db.delete(db_product)
+    db.query(FeaturedProduct).filter(FeaturedProduct.product_id == product_id).delete()
     db.commit()
+    catalog_index.remove(product_id)
+    product_cache.invalidate(product_id)
+    content_cache.bump("featured-watches", "collections")
     
     return {"message": "Product deleted", "id": product_id}
\ No newline at end of file
@@ -1,60 +1,236 @@
 """
 File upload routes
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
 from auth import require_admin
+from images import image_sources, load_manifest, plan_variants, queue_variants
+import hashlib
 import os
-import uuid
+import tempfile
 from pathlib import Path
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+EXTENSION_ALIASES = {".jpeg": ".jpg"}
+MAX_FILE_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(5 * 1024 * 1024)))  # 5MB
 
-@router.post("/api/admin/upload")
+# Request body bytes buffered before each disk write
+CHUNK_SIZE = 64 * 1024
+
+# Allowance for multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Max size: {MAX_FILE_SIZE / 1024 / 1024}MB"
+    )
+
+
+class StreamedUpload:
+    """The `file` part of a multipart body, spooled to a temp file in UPLOAD_DIR"""
+
+    def __init__(self):
+        self.filename = None
+        self.content_type = None
+        self.extension = None
+        self.size = 0
+        self.temp_path = None
+        self.digest = hashlib.blake2b(digest_size=16)
+        self._handle = None
+        self._pending = []
+        self._buffered = 0
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+
+    # Parser callbacks, called synchronously from MultipartParser.write
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._in_file = False
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name") != b"file" or b"filename" not in options:
+            return
+        if self.filename is not None:
+            raise HTTPException(status_code=400, detail="Only one file per upload")
+
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        self.content_type = self._headers.get(b"content-type", b"").decode("latin-1") or None
+        self.extension = Path(self.filename).suffix.lower()
+        if self.extension not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+            )
+        self.extension = EXTENSION_ALIASES.get(self.extension, self.extension)
+        self._in_file = True
+
+    def _on_part_data(self, data, start, end):
+        if not self._in_file:
+            return
+        self.size += end - start
+        if self.size > MAX_FILE_SIZE:
+            raise file_too_large()
+        self._pending.append(data[start:end])
+        self._buffered += end - start
+
+    def _callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+        }
+
+    # Disk side, always run in the threadpool
+
+    def _open(self):
+        fd, self.temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-", suffix=".part")
+        self._handle = os.fdopen(fd, "wb")
+
+    def _write(self, chunks: list[bytes]):
+        data = b"".join(chunks)
+        self.digest.update(data)
+        self._handle.write(data)
+
+    async def _flush(self):
+        pending, self._pending, self._buffered = self._pending, [], 0
+        if pending:
+            await run_in_threadpool(self._write, pending)
+
+    def _finish(self):
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+
+    def store(self) -> tuple[str, bool]:
+        """
+        Move the temp file to its content-addressed name, BLAKE2b of the
+        bytes. Returns (filename, created); identical bytes already stored
+        are reused and the temp file is dropped.
+        """
+        filename = f"{self.digest.hexdigest()}{self.extension}"
+        file_path = os.path.join(UPLOAD_DIR, filename)
+
+        if os.path.exists(file_path):
+            self.discard()
+            # Fresh mtime keeps the cleanup sweep's grace period from deleting it
+            os.utime(file_path)
+            return filename, False
+
+        # Temp file lives in UPLOAD_DIR, so the rename is atomic
+        os.replace(self.temp_path, file_path)
+        self.temp_path = None
+        return filename, True
+
+    def discard(self):
+        if self._handle is not None:
+            self._handle.close()
+        if self.temp_path is not None and os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+    async def receive(self, request: Request):
+        """Stream the request body through the parser into the temp file"""
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+        # Reject declared oversize bodies before reading anything
+        declared = request.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+            raise file_too_large()
+
+        await run_in_threadpool(self._open)
+        parser = MultipartParser(options[b"boundary"], self._callbacks())
+
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if self._buffered >= CHUNK_SIZE:
+                await self._flush()
+
+        parser.finalize()
+        if self.filename is None:
+            raise HTTPException(status_code=400, detail="No file in upload")
+
+        await self._flush()
+        await run_in_threadpool(self._finish)
+
+
+# The body is parsed by StreamedUpload, so the form is described by hand
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["file"],
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            }
+        }
+    },
+}
+
+
+@router.post("/api/admin/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
 async def upload_file(
     request: Request,
-    file: UploadFile = File(...),
     current_user = Depends(require_admin)
 ):
-    """Upload image file"""
-    # Check file extension
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Read file
-    contents = await file.read()
-    
-    # Check file size
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max size: {MAX_FILE_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(contents)
-    
+    """Upload image file (multipart field `file`), streamed to disk as it arrives"""
+    upload = StreamedUpload()
+    try:
+        await upload.receive(request)
+
+        # Reads only the image header; None when Pillow is not installed
+        try:
+            manifest = await run_in_threadpool(plan_variants, upload.temp_path)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="File is not a valid image")
+
+        unique_filename, created = await run_in_threadpool(upload.store)
+    finally:
+        await run_in_threadpool(upload.discard)
+
+    # Variants are encoded in the image pool, once per distinct content
+    stem = Path(unique_filename).stem
+    if manifest is not None and (created or load_manifest(stem) is None):
+        file_path = os.path.join(UPLOAD_DIR, unique_filename)
+        queue_variants(file_path, manifest)
+
     # Get base URL from request
     base_url = str(request.base_url).rstrip('/')
-    
+
     # Return full URL
     file_url = f"{base_url}/uploads/{unique_filename}"
-    
+
     return {
         "url": file_url,
         "filename": unique_filename,
-        "size": len(contents),
-        "mimeType": file.content_type
-    }
\ No newline at end of file
+        "size": upload.size,
+        "mimeType": upload.content_type,
+        # Planned variants; pages list them once they are encoded
+        "sources": image_sources(file_url, manifest),
+        "deduplicated": not created
+    }
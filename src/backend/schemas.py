@@ -1,7 +1,7 @@
 """
 Pydantic schemas for request/response validation
 """
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict
 from datetime import datetime
 
@@ -27,6 +27,11 @@ class ProductBase(BaseModel):
     inStock: bool = True
     stockQuantity: int = 0
     sku: Optional[str] = None
+    # Filter facets
+    movement: Optional[str] = None
+    caseMaterial: Optional[str] = None
+    dialColor: Optional[str] = None
+    waterResistance: Optional[str] = None
 
 class ProductCreate(ProductBase):
     pass
@@ -42,6 +47,11 @@ class ProductUpdate(BaseModel):
     specs: Optional[Dict[str, str]] = None
     inStock: Optional[bool] = None
     stockQuantity: Optional[int] = None
+    # Filter facets
+    movement: Optional[str] = None
+    caseMaterial: Optional[str] = None
+    dialColor: Optional[str] = None
+    waterResistance: Optional[str] = None
 
 # Collection schemas
 class CollectionBase(BaseModel):
@@ -65,7 +75,7 @@ class CollectionUpdate(BaseModel):
 # Order schemas
 class OrderItem(BaseModel):
     productId: str
-    quantity: int
+    quantity: int = Field(gt=0)
     price: float
 
 class CustomerData(BaseModel):
@@ -151,4 +161,8 @@ class BookingResponse(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BookingPage(BaseModel):
+    data: List[BookingResponse]
+    pagination: dict
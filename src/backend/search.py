@@ -0,0 +1,220 @@
+"""
+Full-text product search
+SQLite FTS5 index kept in sync with the products table by triggers
+"""
+import re
+from typing import Optional
+
+from sqlalchemy import text, or_, false, column
+from sqlalchemy.orm import Session
+
+from database import Product
+
+# Characters folded before indexing and querying: ё/е spelling variants in
+# Russian and the many apostrophes used in Uzbek Latin (oʻ, gʻ, o'zbek)
+FOLD_MAP = {
+    "ё": "е",
+    "Ё": "Е",
+    "ʻ": "",
+    "ʼ": "",
+    "‘": "",
+    "’": "",
+    "`": "",
+    "'": "",
+}
+
+# Indexed columns and their bm25 weights, name and SKU rank highest
+FTS_COLUMNS = {
+    "name": 10.0,
+    "sku": 8.0,
+    "description": 1.0,
+    "features": 2.0,
+    "specs": 1.0,
+}
+
+FTS_TARGET = f"products_fts(rowid, {', '.join(FTS_COLUMNS)})"
+
+# FTS rows are keyed by an INTEGER PRIMARY KEY of their own: the implicit
+# rowid of products (TEXT primary key) may be renumbered by VACUUM
+KEYS_TABLE = "products_fts_keys"
+
+# products_fts rows to product ids
+FTS_PRODUCTS = (
+    f"products_fts JOIN {KEYS_TABLE} ON {KEYS_TABLE}.fts_rowid = products_fts.rowid "
+    f"JOIN products ON products.id = {KEYS_TABLE}.product_id"
+)
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def fold_text(value: str) -> str:
+    """Apply FOLD_MAP, same as the index triggers (case is folded by the tokenizer)"""
+    for src, dst in FOLD_MAP.items():
+        value = value.replace(src, dst)
+    return value
+
+
+def _sql_fold(expr: str) -> str:
+    for src, dst in FOLD_MAP.items():
+        expr = f"replace({expr}, '{src.replace(chr(39), chr(39) * 2)}', '{dst}')"
+    return f"coalesce({expr}, '')"
+
+
+def _fts_key(row: str) -> str:
+    return f"(SELECT fts_rowid FROM {KEYS_TABLE} WHERE product_id = {row}.id)"
+
+
+def _fts_values(row: str) -> str:
+    return ", ".join([_fts_key(row)] + [_sql_fold(f"{row}.{column}") for column in FTS_COLUMNS])
+
+
+def _trigger_sql() -> dict:
+    """Sync triggers by name"""
+    return {
+        "products_fts_ai": (
+            "CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN "
+            f"INSERT INTO {KEYS_TABLE}(product_id) VALUES (new.id); "
+            f"INSERT INTO {FTS_TARGET} VALUES ({_fts_values('new')}); END"
+        ),
+        "products_fts_ad": (
+            "CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN "
+            f"DELETE FROM products_fts WHERE rowid = {_fts_key('old')}; "
+            f"DELETE FROM {KEYS_TABLE} WHERE product_id = old.id; END"
+        ),
+        # Only id and indexed columns, so stock and price updates skip the FTS rewrite
+        "products_fts_au": (
+            f"CREATE TRIGGER products_fts_au AFTER UPDATE OF id, {', '.join(FTS_COLUMNS)} ON products BEGIN "
+            f"DELETE FROM products_fts WHERE rowid = {_fts_key('old')}; "
+            f"UPDATE {KEYS_TABLE} SET product_id = new.id WHERE product_id = old.id; "
+            f"INSERT INTO {FTS_TARGET} VALUES ({_fts_values('new')}); END"
+        ),
+    }
+
+
+def init_search_index(engine):
+    """Create the FTS5 table and sync triggers, backfilling on first run"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    triggers = _trigger_sql()
+    with engine.begin() as conn:
+        tables = set(conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('products_fts', :keys)"
+        ), {"keys": KEYS_TABLE}).scalars())
+        if tables == {"products_fts", KEYS_TABLE}:
+            # Databases created before a trigger changed
+            current = dict(conn.execute(text(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'products'"
+            )).all())
+            for name, sql in triggers.items():
+                if current.get(name) != sql:
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+                    conn.execute(text(sql))
+            return
+
+        # New database, or an index keyed by the products rowid: build it from scratch
+        for name in triggers:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        conn.execute(text("DROP TABLE IF EXISTS products_fts"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {KEYS_TABLE}"))
+
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE products_fts USING fts5("
+            f"{', '.join(FTS_COLUMNS)}, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(f"CREATE TABLE {KEYS_TABLE} (fts_rowid INTEGER PRIMARY KEY, product_id TEXT NOT NULL UNIQUE)"))
+        for sql in triggers.values():
+            conn.execute(text(sql))
+
+        # Backfill existing products
+        conn.execute(text(f"INSERT INTO {KEYS_TABLE}(product_id) SELECT id FROM products"))
+        conn.execute(text(f"INSERT INTO {FTS_TARGET} SELECT {_fts_values('products')} FROM products"))
+
+
+def build_match_query(search: str, columns: Optional[list[str]] = None) -> Optional[str]:
+    """FTS5 MATCH expression: every token must match, as a prefix"""
+    tokens = TOKEN_RE.findall(fold_text(search))
+    if not tokens:
+        return None
+
+    query = " ".join(f'"{token}"*' for token in tokens)
+    if columns:
+        query = f"{{{' '.join(columns)}}} : ({query})"
+    return query
+
+
+def _like_condition(search: str):
+    pattern = f"%{search}%"
+    return or_(
+        Product.name.ilike(pattern),
+        Product.sku.ilike(pattern),
+        Product.description.ilike(pattern),
+    )
+
+
+def search_condition(db: Session, search: str):
+    """
+    Filter for products matching a search string, evaluated in the
+    database (no id list is bound, however many products match)
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return _like_condition(search)
+
+    query = build_match_query(search)
+    if query is None:
+        return false()
+    matches = text(
+        f"SELECT {KEYS_TABLE}.product_id FROM products_fts "
+        f"JOIN {KEYS_TABLE} ON {KEYS_TABLE}.fts_rowid = products_fts.rowid "
+        "WHERE products_fts MATCH :query"
+    ).bindparams(query=query).columns(column("product_id"))
+    return Product.id.in_(matches)
+
+
+def search_product_ids(db: Session, search: str, limit: Optional[int] = None) -> list[str]:
+    """
+    Product ids matching a search string, best match first.
+    A string with nothing searchable in it matches nothing.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        rows = db.query(Product.id).filter(_like_condition(search)).limit(limit).all()
+        return [row[0] for row in rows]
+
+    query = build_match_query(search)
+    if query is None:
+        return []
+
+    weights = ", ".join(str(weight) for weight in FTS_COLUMNS.values())
+    sql = (
+        f"SELECT products.id FROM {FTS_PRODUCTS} "
+        f"WHERE products_fts MATCH :query ORDER BY bm25(products_fts, {weights})"
+    )
+    if limit is not None:
+        sql += " LIMIT :limit"
+
+    rows = db.execute(text(sql), {"query": query, "limit": limit}).all()
+    return [row[0] for row in rows]
+
+
+def suggest_products(db: Session, search: str, limit: int = 8) -> list[dict]:
+    """Typeahead: products whose name or SKU starts with the typed words"""
+    query = build_match_query(search, columns=["name", "sku"])
+    if query is None or db.get_bind().dialect.name != "sqlite":
+        return []
+
+    rows = db.execute(text(
+        "SELECT products.id, products.name, products.collection, products.image, products.price "
+        f"FROM {FTS_PRODUCTS} "
+        "WHERE products_fts MATCH :query ORDER BY bm25(products_fts, 10.0, 8.0) LIMIT :limit"
+    ), {"query": query, "limit": limit}).all()
+
+    return [
+        {
+            "id": row.id,
+            "name": row.name,
+            "collection": row.collection,
+            "image": row.image,
+            "price": row.price
+        }
+        for row in rows
+    ]
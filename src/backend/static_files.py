@@ -0,0 +1,376 @@
+"""
+Static file serving for /uploads
+Conditional GETs, byte ranges, precompressed siblings and a stat/content
+cache. Uploaded files never change under a given name, so they are cached
+forever. Mounted by main.py, or run on its own so image traffic stays out
+of the API workers:
+
+    uvicorn static_files:app --port 8001 --workers 2
+"""
+import email.utils
+import mimetypes
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+
+# Browsers and CDNs may keep uploads for a year without revalidating
+UPLOADS_CACHE_CONTROL = os.getenv("UPLOADS_CACHE_CONTROL", "public, max-age=31536000, immutable")
+
+# Seconds a stat result is trusted; missing files are rechecked sooner,
+# since image variants appear shortly after the upload
+STAT_CACHE_TTL = float(os.getenv("UPLOADS_STAT_CACHE_TTL", "60"))
+MISSING_CACHE_TTL = 1.0
+STAT_CACHE_SIZE = int(os.getenv("UPLOADS_STAT_CACHE_SIZE", "10000"))
+
+# Files up to this size are kept in memory (thumbnails), within the total budget
+MEMORY_FILE_LIMIT = int(os.getenv("UPLOADS_MEMORY_FILE_LIMIT", str(256 * 1024)))
+MEMORY_CACHE_BYTES = int(os.getenv("UPLOADS_MEMORY_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Internal nginx location for X-Accel-Redirect, e.g. /protected-uploads/;
+# nginx then sends the file itself with sendfile
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "")
+
+CHUNK_SIZE = 256 * 1024
+
+# Types worth serving from .br / .gz siblings; images are already compressed
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/javascript", "image/svg+xml",
+    "text/css", "text/html", "text/plain", "text/xml",
+}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CONTENT_HASH_NAME = re.compile(r"^[0-9a-f]{32}$")
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileInfo:
+    __slots__ = ("path", "size", "mtime", "etag", "last_modified", "content_type", "encoded", "body")
+
+    def __init__(self, path: str, stat: os.stat_result, content_type: str, etag: str):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = etag
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.encoded = {}  # content-coding -> FileInfo of the sibling
+        self.body = None  # whole file, for small files once read
+
+
+def file_etag(name: str, stat: os.stat_result) -> str:
+    """The content hash for content-addressed uploads, size and mtime otherwise"""
+    stem = name.split(".", 1)[0]
+    if CONTENT_HASH_NAME.match(stem):
+        return f'"{stem}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def load_info(path: str) -> Optional[FileInfo]:
+    """stat a file and its precompressed siblings; None when it is not a regular file"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+
+    name = os.path.basename(path)
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    info = FileInfo(path, stat, content_type, file_etag(name, stat))
+
+    if content_type in COMPRESSIBLE_TYPES:
+        for coding, suffix in ENCODINGS:
+            try:
+                sibling = os.stat(path + suffix)
+            except OSError:
+                continue
+            info.encoded[coding] = FileInfo(
+                path + suffix, sibling, content_type,
+                f'"{sibling.st_size:x}-{sibling.st_mtime_ns:x}-{coding}"',
+            )
+    return info
+
+
+class FileCache:
+    """LRU of FileInfo per relative path, plus the bodies of small files"""
+
+    def __init__(self, max_entries: int = STAT_CACHE_SIZE, memory_budget: int = MEMORY_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self._entries = OrderedDict()  # path -> (checked_at, FileInfo or None)
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> tuple[bool, Optional[FileInfo]]:
+        """(fresh, info); fresh is False when the entry needs a new stat"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return False, None
+            checked_at, info = entry
+            ttl = STAT_CACHE_TTL if info is not None else MISSING_CACHE_TTL
+            if now - checked_at >= ttl:
+                return False, info
+            self._entries.move_to_end(path)
+            return True, info
+
+    def put(self, path: str, info: Optional[FileInfo], previous: Optional[FileInfo] = None):
+        # Keep the cached body when the file is unchanged
+        if info is not None and previous is not None and previous.etag == info.etag:
+            info.body = previous.body
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._release(old[1])
+            if info is not None and info.body is not None:
+                self.memory_used += len(info.body)
+            self._entries[path] = (time.monotonic(), info)
+            self._shrink()
+
+    def keep_body(self, path: str, info: FileInfo, body: bytes):
+        """Hold a small file's bytes, if its entry (or sibling) is still cached"""
+        if len(body) > MEMORY_FILE_LIMIT:
+            return
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[1] is None or info.body is not None:
+                return
+            if info is not entry[1] and info not in entry[1].encoded.values():
+                return
+            info.body = body
+            self.memory_used += len(body)
+            self._shrink()
+
+    def _release(self, info: Optional[FileInfo]):
+        if info is None:
+            return
+        for held in (info, *info.encoded.values()):
+            if held.body is not None:
+                self.memory_used -= len(held.body)
+
+    def _shrink(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.memory_used > self.memory_budget):
+            _, (_, info) = self._entries.popitem(last=False)
+            self._release(info)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory_used = 0
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    (start, end inclusive) of a single byte range, None to serve the whole
+    file (absent, malformed or multi-range). Raises ValueError when unsatisfiable.
+    """
+    match = RANGE_HEADER.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+class UploadFiles:
+    """ASGI app serving files from a directory; dotfiles (temp uploads) are hidden"""
+
+    def __init__(self, directory: str, prefix: str = "", cache: Optional[FileCache] = None):
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix.rstrip("/")
+        self.cache = cache or FileCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] not in ("GET", "HEAD"):
+            await self.send_empty(send, 405, [(b"allow", b"GET, HEAD")])
+            return
+
+        relative, info = await self.lookup(scope["path"])
+        if info is None:
+            await self.send_empty(send, 404, [(b"content-type", b"text/plain")], b"Not Found")
+            return
+
+        request_headers = Headers(scope=scope)
+        headers = [(b"cache-control", UPLOADS_CACHE_CONTROL.encode("latin-1"))]
+
+        if info.content_type in COMPRESSIBLE_TYPES:
+            headers.append((b"vary", b"Accept-Encoding"))
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for coding, _ in ENCODINGS:
+                if coding in accepted and coding in info.encoded:
+                    info = info.encoded[coding]
+                    headers.append((b"content-encoding", coding.encode()))
+                    break
+
+        headers += [
+            (b"etag", info.etag.encode()),
+            (b"last-modified", info.last_modified.encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+
+        if self.not_modified(request_headers, info):
+            await self.send_empty(send, 304, headers)
+            return
+
+        headers.append((b"content-type", info.content_type.encode()))
+
+        if UPLOADS_ACCEL_PREFIX and scope["method"] == "GET":
+            # nginx serves the body (and ranges) itself via sendfile
+            relative = os.path.relpath(info.path, self.directory).replace(os.sep, "/")
+            headers.append((b"x-accel-redirect", (UPLOADS_ACCEL_PREFIX.rstrip("/") + "/" + relative).encode()))
+            await self.send_empty(send, 200, headers)
+            return
+
+        status, start, end = 200, 0, info.size - 1
+        range_header = request_headers.get("range")
+        if range_header and b"content-encoding" not in dict(headers) and self.range_applies(request_headers, info):
+            try:
+                byte_range = parse_range(range_header, info.size)
+            except ValueError:
+                await self.send_empty(send, 416, headers + [(b"content-range", f"bytes */{info.size}".encode())])
+                return
+            if byte_range is not None:
+                status, (start, end) = 206, byte_range
+                headers.append((b"content-range", f"bytes {start}-{end}/{info.size}".encode()))
+
+        length = end - start + 1
+        headers.append((b"content-length", str(length).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+        if scope["method"] == "HEAD" or length <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await self.send_file(scope, send, relative, info, start, length)
+
+    async def lookup(self, path: str) -> tuple[str, Optional[FileInfo]]:
+        """(relative path, info) for a request path; info is None when not servable"""
+        if self.prefix:
+            if not path.startswith(self.prefix + "/"):
+                return path, None
+            path = path[len(self.prefix):]
+
+        parts = [part for part in path.split("/") if part]
+        # Hides dotfiles (in-progress uploads) and rules out ".." traversal
+        if not parts or any(part.startswith(".") or "\\" in part for part in parts):
+            return path, None
+
+        relative = "/".join(parts)
+        fresh, info = self.cache.get(relative)
+        if fresh:
+            return relative, info
+
+        full_path = os.path.join(self.directory, *parts)
+        new_info = await anyio.to_thread.run_sync(self.load_inside, full_path)
+        self.cache.put(relative, new_info, info)
+        return relative, new_info
+
+    def load_inside(self, full_path: str) -> Optional[FileInfo]:
+        # Symlinks must not lead out of the upload directory
+        if os.path.commonpath([os.path.realpath(full_path), self.directory]) != self.directory:
+            return None
+        return load_info(full_path)
+
+    @staticmethod
+    def not_modified(request_headers: Headers, info: FileInfo) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return any(
+                tag.strip() == "*" or tag.strip().removeprefix("W/") == info.etag
+                for tag in if_none_match.split(",")
+            )
+
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            since = email.utils.parsedate_tz(if_modified_since)
+            if since is not None:
+                return info.mtime <= email.utils.mktime_tz(since)
+        return False
+
+    @staticmethod
+    def range_applies(request_headers: Headers, info: FileInfo) -> bool:
+        """If-Range only lets the range through when the client's copy is current"""
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        return if_range.strip() in (info.etag, info.last_modified)
+
+    async def send_file(self, scope, send, relative: str, info: FileInfo, start: int, length: int):
+        if info.body is not None:
+            await send({"type": "http.response.body", "body": info.body[start:start + length]})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(info.path, "rb") as handle:
+                await send({"type": "http.response.zerocopy", "file": handle, "offset": start, "count": length})
+            return
+
+        if info.size <= MEMORY_FILE_LIMIT:
+            body = await anyio.to_thread.run_sync(self.read_all, info.path)
+            self.cache.keep_body(relative, info, body)
+            await send({"type": "http.response.body", "body": body[start:start + length]})
+            return
+
+        async with await anyio.open_file(info.path, "rb") as handle:
+            await handle.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = await handle.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; close the response
+                await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    def read_all(path: str) -> bytes:
+        with open(path, "rb") as handle:
+            return handle.read()
+
+    @staticmethod
+    async def send_empty(send, status: int, headers: list, body: bytes = b""):
+        headers = [(name, value) for name, value in headers if name != b"content-length"]
+        if status != 304:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Standalone app serving UPLOAD_DIR under /uploads
+app = UploadFiles(os.getenv("UPLOAD_DIR", "uploads"), prefix="/uploads")
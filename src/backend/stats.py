@@ -0,0 +1,186 @@
+"""
+Dashboard counters
+Counts (and order totals) per key in the stats table, changed by an ORM flush
+hook in the same transaction as the orders, bookings, products and users they
+count, so the dashboard reads a few rows instead of aggregating whole tables.
+
+Core bulk statements (insert()/update()/delete() on counted tables) bypass the
+hook and must call add() themselves. reconcile_stats.py recounts from scratch.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, inspect, insert, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from database import StatCounter, Order, Booking, Product, User
+
+# model: (key prefix, attribute split into "<prefix>:<value>" keys, attribute summed into amount)
+COUNTED = {
+    Order: ("orders", "status", "total"),
+    Booking: ("bookings", "status", None),
+    Product: ("products", None, None),
+    User: ("users", "role", None),
+}
+
+# Float sums of order totals may differ from a fresh SUM by rounding
+AMOUNT_TOLERANCE = 0.005
+
+stats_table = StatCounter.__table__
+
+
+class Counters(dict):
+    """{key: (count, amount)} with zero for keys never counted"""
+
+    def count(self, key: str) -> int:
+        return self.get(key, (0, 0))[0]
+
+    def amount(self, key: str) -> float:
+        return self.get(key, (0, 0))[1]
+
+
+def contributions(model, values: dict) -> dict:
+    """{key: (count, amount)} one row adds to, from its tracked attribute values"""
+    prefix, group, amount = COUNTED[model]
+    row_amount = (values.get(amount) or 0) if amount else 0
+    keys = {prefix: (1, row_amount)}
+    if group and values.get(group) is not None:
+        keys[f"{prefix}:{values[group]}"] = (1, row_amount)
+    return keys
+
+
+def _tracked(model) -> list[str]:
+    _, group, amount = COUNTED[model]
+    return [name for name in (group, amount) if name]
+
+
+def old_values(state, names: list[str]) -> dict:
+    """Attribute values as last loaded from the database, without loading anything"""
+    values = {}
+    for name in names:
+        history = state.attrs[name].history
+        previous = history.deleted or history.unchanged
+        values[name] = previous[0] if previous else None
+    return values
+
+
+def _merge(deltas: dict, keys: dict, sign: int):
+    for key, (count, amount) in keys.items():
+        total_count, total_amount = deltas.get(key, (0, 0))
+        deltas[key] = (total_count + sign * count, total_amount + sign * amount)
+
+
+def record_flush(session: Session):
+    """after_flush hook: apply the counter changes of the rows just written"""
+    deltas = {}
+
+    for obj in session.new:
+        model = type(obj)
+        if model in COUNTED:
+            _merge(deltas, contributions(model, {name: getattr(obj, name) for name in _tracked(model)}), 1)
+
+    for obj in session.deleted:
+        model = type(obj)
+        if model in COUNTED:
+            _merge(deltas, contributions(model, old_values(inspect(obj), _tracked(model))), -1)
+
+    for obj in session.dirty:
+        model = type(obj)
+        if model not in COUNTED or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        names = _tracked(model)
+        if not any(state.attrs[name].history.has_changes() for name in names):
+            continue
+        _merge(deltas, contributions(model, old_values(state, names)), -1)
+        _merge(deltas, contributions(model, {name: getattr(obj, name) for name in names}), 1)
+
+    if deltas:
+        add(session, deltas)
+
+
+def add(session: Session, deltas: dict):
+    """Add {key: (count, amount)} to the counters within the session's transaction"""
+    connection = session.connection()
+    now = datetime.utcnow()
+    for key, (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+        updated = connection.execute(
+            update(stats_table).where(stats_table.c.key == key).values(
+                count=stats_table.c.count + count,
+                amount=stats_table.c.amount + amount,
+                updated_at=now
+            )
+        ).rowcount
+        if not updated:
+            connection.execute(insert(stats_table).values(key=key, count=count, amount=amount, updated_at=now))
+
+
+def read_counters(db: Session, for_update: bool = False) -> Counters:
+    """All counters in one query"""
+    query = db.query(StatCounter.key, StatCounter.count, StatCounter.amount)
+    if for_update:
+        query = query.with_for_update()
+    return Counters((key, (count, amount)) for key, count, amount in query)
+
+
+def recount(db: Session) -> Counters:
+    """Counters computed from the counted tables"""
+    actual = Counters()
+    for model, (prefix, group, amount) in COUNTED.items():
+        columns = [func.count()] + ([func.sum(getattr(model, amount))] if amount else [])
+        if group:
+            group_column = getattr(model, group)
+            rows = db.query(group_column, *columns).group_by(group_column).all()
+        else:
+            rows = [(None, *db.query(*columns).select_from(model).one())]
+
+        for value, count, *total in rows:
+            row_keys = contributions(model, {group: value} if group else {})
+            _merge(actual, {key: (count, (total[0] or 0) if total else 0) for key in row_keys}, 1)
+    return actual
+
+
+def reconcile(db: Session, fix: bool = True) -> list[tuple]:
+    """
+    Compare stored counters with a recount; returns [(key, stored, actual)]
+    for every key that drifted and, with fix, overwrites them and commits.
+    """
+    # Row locks keep writers out between recount and overwrite (no-op on SQLite,
+    # where a write that lost the race fails with "database is locked" instead)
+    stored = read_counters(db, for_update=True)
+    actual = recount(db)
+
+    drift = []
+    for key in sorted(set(stored) | set(actual)):
+        before, after = stored.get(key, (0, 0)), actual.get(key, (0, 0))
+        if before[0] != after[0] or abs(before[1] - after[1]) > AMOUNT_TOLERANCE:
+            drift.append((key, before, after))
+
+    if fix and drift:
+        now = datetime.utcnow()
+        connection = db.connection()
+        for key, before, (count, amount) in drift:
+            values = {"count": count, "amount": amount, "updated_at": now}
+            if key in stored:
+                connection.execute(update(stats_table).where(stats_table.c.key == key).values(**values))
+            else:
+                connection.execute(insert(stats_table).values(key=key, **values))
+        db.commit()
+
+    return drift
+
+
+def init_stats(engine):
+    """Count everything once when the stats table is new"""
+    with Session(bind=engine) as db:
+        if db.query(StatCounter.key).first() is not None:
+            return
+        try:
+            reconcile(db)
+        except (IntegrityError, OperationalError):
+            # Workers starting together: fine if another one got there first
+            db.rollback()
+            if db.query(StatCounter.key).first() is None:
+                raise
@@ -0,0 +1,36 @@
+"""
+Test setup: the app runs against a fresh SQLite database and upload folder
+in a temporary directory, seeded with init_db.py's default data.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Must be set before database.py is imported
+TEST_DIR = tempfile.mkdtemp(prefix="orient-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'orient.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(TEST_DIR, "uploads")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from database import init_db
+    from init_db import create_default_data
+    import main
+
+    init_db()
+    create_default_data()
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    response = client.post("/api/admin/login", json={"email": "admin@orient.uz", "password": "admin123"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['token']}"}
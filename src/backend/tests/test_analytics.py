@@ -0,0 +1,39 @@
+from database import SessionLocal, DailySales
+
+
+def test_cancelled_orders_leave_no_empty_groups(client, admin_headers):
+    product = client.get("/api/products", params={"limit": 1}).json()["data"][0]
+    response = client.post("/api/orders", json={
+        "items": [{"productId": product["id"], "quantity": 1, "price": product["price"]}],
+        "customer": {"fullName": "Test Buyer", "email": "buyer@example.com", "phone": "+998901234567"},
+        "deliveryMethod": "pickup",
+        "paymentMethod": "analytics-test",
+        "subtotal": product["price"],
+        "shipping": 0,
+        "total": product["price"],
+    })
+    assert response.status_code == 200, response.text
+    order_number = response.json()["orderNumber"]
+
+    def rollup_statuses():
+        db = SessionLocal()
+        try:
+            return dict(db.query(DailySales.status, DailySales.orders).filter(
+                DailySales.payment_method == "analytics-test"
+            ))
+        finally:
+            db.close()
+
+    assert rollup_statuses() == {"pending": 1}
+
+    response = client.put(f"/api/admin/orders/{order_number}/status", headers=admin_headers, json={"status": "cancelled"})
+    assert response.status_code == 200
+    assert rollup_statuses() == {"cancelled": 1}
+
+    for by in ("status", "paymentMethod", "deliveryMethod"):
+        groups = client.get("/api/admin/analytics/breakdown", params={"by": by}, headers=admin_headers).json()
+        assert groups and all(group["orders"] > 0 for group in groups), groups
+
+    methods = client.get("/api/admin/analytics/breakdown", params={"by": "paymentMethod"}, headers=admin_headers).json()
+    test_group = next(group for group in methods if group["value"] == "analytics-test")
+    assert (test_group["orders"], test_group["cancellationRate"]) == (1, 1)
@@ -0,0 +1,49 @@
+import pytest
+
+import auth
+from auth import login_throttle, login_ip_throttle
+
+
+@pytest.fixture
+def throttle(monkeypatch):
+    monkeypatch.setattr(login_throttle, "limit", 3)
+    monkeypatch.setattr(login_ip_throttle, "limit", 6)
+    for bucket in (login_throttle, login_ip_throttle):
+        bucket._attempts.clear()
+    yield login_throttle
+    for bucket in (login_throttle, login_ip_throttle):
+        bucket._attempts.clear()
+
+
+def login(client, email: str, password: str, forwarded_for: str = None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+    return client.post("/api/admin/login", json={"email": email, "password": password}, headers=headers)
+
+
+def test_failed_logins_for_one_account_do_not_lock_out_others(client, throttle):
+    for _ in range(3):
+        assert login(client, "attacker-target@orient.uz", "wrong").status_code == 401
+    assert login(client, "attacker-target@orient.uz", "wrong").status_code == 429
+
+    assert login(client, "admin@orient.uz", "admin123").status_code == 200
+
+
+def test_forwarded_address_counts_only_behind_trusted_proxy(client, throttle, monkeypatch):
+    # Untrusted peer: a spoofed header does not earn a fresh bucket
+    for address in ("203.0.113.1", "203.0.113.2", "203.0.113.3"):
+        assert login(client, "admin@orient.uz", "wrong", address).status_code == 401
+    assert login(client, "admin@orient.uz", "wrong", "203.0.113.4").status_code == 429
+
+    # Behind a trusted proxy, each client address has its own bucket
+    monkeypatch.setattr(auth, "TRUSTED_PROXIES", {"testclient"})
+    for _ in range(3):
+        assert login(client, "admin@orient.uz", "wrong", "198.51.100.7").status_code == 401
+    assert login(client, "admin@orient.uz", "wrong", "198.51.100.7").status_code == 429
+    assert login(client, "admin@orient.uz", "admin123", "198.51.100.8, testclient").status_code == 200
+
+
+def test_rotating_emails_from_one_address_is_throttled(client, throttle):
+    for n in range(6):
+        assert login(client, f"stuffed-{n}@example.com", "guess").status_code == 401
+    assert login(client, "stuffed-6@example.com", "guess").status_code == 429
+    assert login(client, "admin@orient.uz", "admin123").status_code == 429
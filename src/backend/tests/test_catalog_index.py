@@ -0,0 +1,49 @@
+import threading
+import time
+
+from catalog_index import CatalogIndex
+from database import SessionLocal
+
+
+def test_stale_index_is_rebuilt_by_one_caller(client, admin_headers):
+    client.post("/api/admin/products", headers=admin_headers, json={
+        "name": "Index Test Watch", "collection": "Index Test", "price": 100, "stockQuantity": 1,
+    })
+    index = CatalogIndex(max_age=0)
+    db = SessionLocal()
+    try:
+        index.load(db)
+        assert index.count("collection", "Index Test") > 0
+    finally:
+        db.close()
+
+    loads = []
+    original_load = index.load
+
+    def slow_load(db):
+        loads.append(threading.get_ident())
+        time.sleep(0.2)
+        original_load(db)
+
+    index.load = slow_load
+    time.sleep(0.01)
+
+    counts = []
+
+    def worker():
+        db = SessionLocal()
+        try:
+            index.ensure_loaded(db)
+            counts.append(index.count("collection", "Index Test"))
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    # Callers not rebuilding were answered from the previous index
+    assert len(counts) == 8 and all(counts)
@@ -0,0 +1,47 @@
+import json
+
+FACETS = {"movement": "automatic", "caseMaterial": "titanium", "dialColor": "green", "waterResistance": "200m"}
+
+
+def exported(client, admin_headers, sku: str, format: str) -> bytes:
+    response = client.get("/api/admin/products/export", params={"format": format}, headers=admin_headers)
+    assert response.status_code == 200
+    lines = response.content.splitlines(keepends=True)
+    if format == "csv":
+        return lines[0] + b"".join(line for line in lines[1:] if sku.encode() in line)
+    return b"".join(line for line in lines if json.loads(line)["sku"] == sku)
+
+
+def test_export_import_round_trip_keeps_facets(client, admin_headers):
+    for format, content_type in (("ndjson", "application/x-ndjson"), ("csv", "text/csv")):
+        sku = f"RT-{format}"
+        created = client.post("/api/admin/products", headers=admin_headers, json={
+            "name": f"Round Trip {format}", "collection": "Sports", "price": 250, "sku": sku, **FACETS
+        })
+        assert created.status_code == 200
+        assert {field: created.json()[field] for field in FACETS} == FACETS
+        product_id = created.json()["id"]
+
+        backup = exported(client, admin_headers, sku, format)
+
+        # Updating from the backup restores changed facets
+        client.put(f"/api/admin/products/{product_id}", headers=admin_headers, json={
+            "movement": "quartz", "dialColor": "white"
+        })
+        result = client.post(
+            "/api/admin/products/import", params={"format": format}, content=backup,
+            headers={**admin_headers, "Content-Type": content_type}
+        ).json()
+        assert (result["updated"], result["failed"]) == (1, 0), result
+        product = client.get(f"/api/products/{product_id}").json()
+        assert {field: product[field] for field in FACETS} == FACETS
+
+        # Creating from the backup keeps them too
+        assert client.delete(f"/api/admin/products/{product_id}", headers=admin_headers).status_code == 200
+        result = client.post(
+            "/api/admin/products/import", params={"format": format}, content=backup,
+            headers={**admin_headers, "Content-Type": content_type}
+        ).json()
+        assert (result["created"], result["failed"]) == (1, 0), result
+        product = client.get(f"/api/products/{result['rows'][0]['id']}").json()
+        assert {field: product[field] for field in FACETS} == FACETS
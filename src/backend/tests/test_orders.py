@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def stock(client, product_id: str) -> int:
+    return client.get(f"/api/products/{product_id}").json()["stockQuantity"]
+
+
+def order_payload(product: dict, quantity: int, delivery_method: str = "pickup", shipping: float = 0) -> dict:
+    subtotal = product["price"] * quantity
+    return {
+        "items": [{"productId": product["id"], "quantity": quantity, "price": product["price"]}],
+        "customer": {"fullName": "Test Buyer", "email": "buyer@example.com", "phone": "+998901234567"},
+        "deliveryMethod": delivery_method,
+        "paymentMethod": "cash",
+        "subtotal": subtotal,
+        "shipping": shipping,
+        "total": subtotal + shipping,
+    }
+
+
+def place_order(client, product: dict, quantity: int) -> str:
+    response = client.post("/api/orders", json=order_payload(product, quantity))
+    assert response.status_code == 200, response.text
+    return response.json()["orderNumber"]
+
+
+def set_status(client, admin_headers, order_number: str, status: str):
+    return client.put(f"/api/admin/orders/{order_number}/status", headers=admin_headers, json={"status": status})
+
+
+def test_concurrent_status_changes_move_stock_once(client, admin_headers):
+    product = client.get("/api/products", params={"limit": 1}).json()["data"][0]
+    before = stock(client, product["id"])
+    order_number = place_order(client, product, 2)
+    assert stock(client, product["id"]) == before - 2
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: set_status(client, admin_headers, order_number, "cancelled"), range(8)))
+    assert all(response.status_code == 200 for response in responses)
+    assert stock(client, product["id"]) == before
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: set_status(client, admin_headers, order_number, "pending"), range(8)))
+    assert all(response.status_code == 200 for response in responses)
+    assert stock(client, product["id"]) == before - 2
+
+
+def test_orders_from_before_stock_reservation_leave_stock_alone(client, admin_headers):
+    from database import SessionLocal, Order, OrderItem
+
+    product = client.get("/api/products", params={"limit": 1}).json()["data"][0]
+    before = stock(client, product["id"])
+
+    # As migrate_order_items.py leaves an order placed before stock was reserved
+    db = SessionLocal()
+    try:
+        order = Order(order_number="ORD-LEGACY-STOCK", subtotal=product["price"], total=product["price"], status="pending")
+        db.add(order)
+        db.flush()
+        db.add(OrderItem(order_id=order.id, product_id=product["id"], quantity=before + 5, price=product["price"]))
+        db.commit()
+    finally:
+        db.close()
+
+    assert set_status(client, admin_headers, "ORD-LEGACY-STOCK", "cancelled").status_code == 200
+    assert stock(client, product["id"]) == before
+    # Reopening needs no stock either, even more than is available
+    assert set_status(client, admin_headers, "ORD-LEGACY-STOCK", "pending").status_code == 200
+    assert stock(client, product["id"]) == before
+
+
+def test_shipping_is_priced_by_the_server(client, admin_headers):
+    from routes.orders import SHIPPING_RATES, FREE_SHIPPING_THRESHOLD
+
+    cheap = client.post("/api/admin/products", headers=admin_headers, json={
+        "name": "Shipping Test Strap", "collection": "Sports", "price": 100, "stockQuantity": 50,
+    }).json()
+    pricey = client.post("/api/admin/products", headers=admin_headers, json={
+        "name": "Shipping Test Watch", "collection": "Sports", "price": FREE_SHIPPING_THRESHOLD + 1, "stockQuantity": 50,
+    }).json()
+
+    def post(product, method, shipping):
+        return client.post("/api/orders", json=order_payload(product, 1, method, shipping)).status_code
+
+    assert post(cheap, "standard", 0) == 400
+    assert post(cheap, "express", 0) == 400
+    assert post(cheap, "courier", 0) == 400
+    assert post(cheap, "standard", SHIPPING_RATES["standard"]) == 200
+    assert post(cheap, "express", SHIPPING_RATES["express"]) == 200
+    # Free standard delivery above the threshold
+    assert post(pricey, "standard", 0) == 200
+    assert post(pricey, "standard", SHIPPING_RATES["standard"]) == 400
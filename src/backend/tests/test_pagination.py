@@ -0,0 +1,39 @@
+import base64
+import json
+
+
+def cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_product_cursor_round_trip(client):
+    first = client.get("/api/products", params={"limit": 1}).json()
+    next_cursor = first["pagination"]["nextCursor"]
+    assert next_cursor
+
+    second = client.get("/api/products", params={"limit": 1, "cursor": next_cursor}).json()
+    assert second["data"][0]["id"] != first["data"][0]["id"]
+
+
+def test_malformed_product_cursor_is_rejected(client):
+    for payload in ([[1]], [1], [None], ["no-such-product"], ["a", "b"], {"id": "x"}):
+        response = client.get("/api/products", params={"cursor": cursor(payload)})
+        assert response.status_code == 400, payload
+
+    assert client.get("/api/products", params={"cursor": "not base64!"}).status_code == 400
+
+
+def test_malformed_keyset_cursor_is_rejected(client, admin_headers):
+    for path in ("/api/admin/orders", "/api/admin/bookings"):
+        for payload in (
+            [[1], 1],
+            ["2024-01-01T00:00:00", "1"],
+            ["2024-01-01T00:00:00", True],
+            [1, 1],
+            ["yesterday", 1],
+        ):
+            response = client.get(path, params={"cursor": cursor(payload)}, headers=admin_headers)
+            assert response.status_code == 400, (path, payload)
+
+        valid = cursor(["2024-01-01T00:00:00", 1])
+        assert client.get(path, params={"cursor": valid}, headers=admin_headers).status_code == 200
@@ -0,0 +1,65 @@
+from sqlalchemy import text
+
+from database import engine, SessionLocal
+from search import init_search_index, search_product_ids
+
+
+def create(client, admin_headers, name: str, sku: str) -> str:
+    response = client.post("/api/admin/products", headers=admin_headers, json={
+        "name": name, "collection": "Sports", "price": 100, "sku": sku,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def search(client, params: dict, admin_headers=None) -> list[str]:
+    path = "/api/admin/products" if admin_headers else "/api/products"
+    response = client.get(path, params=params, headers=admin_headers or {})
+    assert response.status_code == 200
+    return [product["id"] for product in response.json()["data"]]
+
+
+def test_search_without_tokens_matches_nothing(client, admin_headers):
+    assert search(client, {"search": "!!!"}) == []
+    assert search(client, {"search": "!!!"}, admin_headers) == []
+    assert client.get("/api/products/filters", params={"mode": "selection", "search": "!!!"}).status_code == 200
+
+
+def test_admin_search_matches_without_binding_ids(client, admin_headers):
+    product_id = create(client, admin_headers, "Kamasu Searchable", "SEARCH-ADMIN")
+    assert search(client, {"search": "searchable kamasu"}, admin_headers) == [product_id]
+    assert search(client, {"search": "SEARCH-ADMIN"}) == [product_id]
+
+
+def test_index_survives_renumbered_rowids(client, admin_headers):
+    doomed = [create(client, admin_headers, f"Vacuum Filler {n}", f"VF-{n}") for n in range(5)]
+    kept = create(client, admin_headers, "Vacuum Keeper Zephyr", "VK-1")
+    for product_id in doomed:
+        assert client.delete(f"/api/admin/products/{product_id}", headers=admin_headers).status_code == 200
+
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    # What VACUUM is allowed to do to a table without an INTEGER PRIMARY KEY
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE products SET rowid = rowid + 100000"))
+
+    db = SessionLocal()
+    try:
+        assert search_product_ids(db, "zephyr") == [kept]
+        assert search_product_ids(db, "filler") == []
+    finally:
+        db.close()
+
+
+def test_rowid_keyed_index_is_rebuilt(client, admin_headers):
+    product_id = create(client, admin_headers, "Rebuilt Quasar", "RQ-1")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE products_fts_keys"))
+
+    init_search_index(engine)
+
+    db = SessionLocal()
+    try:
+        assert search_product_ids(db, "quasar") == [product_id]
+    finally:
+        db.close()
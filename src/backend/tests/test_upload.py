@@ -0,0 +1,74 @@
+import io
+
+import pytest
+from PIL import Image
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def upload(client, admin_headers, data: bytes):
+    return client.post(
+        "/api/admin/upload", headers=admin_headers, files={"file": ("watch.png", data, "image/png")}
+    )
+
+
+def test_upload_stores_image(client, admin_headers):
+    response = upload(client, admin_headers, png(40, 30))
+    assert response.status_code == 200, response.text
+    assert response.json()["filename"].endswith(".png")
+
+
+@pytest.mark.parametrize("pixels", [40 * 30 - 1, (40 * 30) // 2 - 1])
+def test_pixel_bomb_is_rejected(client, admin_headers, monkeypatch, pixels):
+    # Over the limit (warning in Pillow) and over twice the limit (DecompressionBombError)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", pixels)
+    response = upload(client, admin_headers, png(40, 30))
+    assert response.status_code == 400, response.text
+
+
+def test_upload_form_is_documented(client):
+    operation = client.get("/openapi.json").json()["paths"]["/api/admin/upload"]["post"]
+    schema = operation["requestBody"]["content"]["multipart/form-data"]["schema"]
+    assert schema["properties"]["file"] == {"type": "string", "format": "binary"}
+
+
+class InlinePool:
+    """Runs image_pool work right away, so the test sees its outcome"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+def test_failed_variants_are_not_advertised(client, admin_headers, monkeypatch):
+    import images
+
+    def broken_encoder(*args):
+        raise OSError("encoder crashed")
+
+    monkeypatch.setattr(images, "image_pool", InlinePool())
+    monkeypatch.setattr(images, "build_variants", broken_encoder)
+    response = upload(client, admin_headers, png(41, 31))
+    assert response.status_code == 200, response.text
+    stem = response.json()["filename"].split(".")[0]
+
+    assert images.load_manifest(stem) is None
+    assert not images.variants_path(stem).exists()
+    assert images.image_sources(response.json()["url"]) is None
+
+
+def test_finished_variants_are_advertised(client, admin_headers, monkeypatch):
+    import images
+
+    monkeypatch.setattr(images, "image_pool", InlinePool())
+    response = upload(client, admin_headers, png(42, 32))
+    assert response.status_code == 200, response.text
+
+    sources = images.image_sources(response.json()["url"])
+    assert sources is not None and sources["width"] == 42
+    for items in sources["variants"].values():
+        for item in items:
+            assert (images.variants_path(response.json()["filename"].split(".")[0]) / item["url"].rsplit("/", 1)[1]).exists()
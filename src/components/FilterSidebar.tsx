@@ -11,8 +11,10 @@ export function FilterSidebar() {
   const [openSections, setOpenSections] = useState<string[]>(['КОЛЛЕКЦИЯ', 'ЦЕНА']);
   useEffect(() => {
     loadCollections();
-    loadFilters();
   }, []);
+  useEffect(() => {
+    loadFilters();
+  }, [searchParams]);
   const loadCollections = async () => {
     try {
       const data = await publicApi.getCollections();
@@ -23,7 +25,7 @@ export function FilterSidebar() {
   };
   const loadFilters = async () => {
     try {
-      const data = await publicApi.getFilters();
+      const data = await publicApi.getFilters(searchParams);
       setFilters(data);
     } catch (error) {
       console.error('Error loading filters:', error);
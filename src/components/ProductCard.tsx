@@ -1,12 +1,18 @@
 import React from 'react';
 import { Link } from 'react-router-dom';
 import { ShoppingBagIcon } from 'lucide-react';
+interface ImageSources {
+  width: number;
+  height: number;
+  srcset: Record<string, string>;
+}
 interface ProductCardProps {
   id: string;
   name: string;
   collection: string;
   price: number;
   image: string;
+  imageSources?: Record<string, ImageSources>;
   index?: number;
 }
 export function ProductCard({
@@ -15,14 +21,20 @@ export function ProductCard({
   collection,
   price,
   image,
+  imageSources,
   index = 0
 }: ProductCardProps) {
   const staggerClass = `animate-stagger-${Math.min(index % 4 + 1, 4)}`;
+  const sources = imageSources?.[image];
+  const sizes = '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw';
   return <div className={`group ${staggerClass}`}>
       <Link to={`/product/${id}`} className="block">
         {/* Image Container - NO grayscale on mobile */}
         <div className="relative aspect-[4/5] bg-white mb-4 sm:mb-6 overflow-hidden">
-          <img src={image} alt={name} className="w-full h-full object-cover transition-all duration-1000 group-hover:scale-105" />
+          <picture className="contents">
+            {sources && Object.entries(sources.srcset).map(([format, srcset]) => <source key={format} type={`image/${format}`} srcSet={srcset} sizes={sizes} />)}
+            <img src={image} alt={name} loading="lazy" className="w-full h-full object-cover transition-all duration-1000 group-hover:scale-105" />
+          </picture>
 
           {/* Gradient Overlay on hover */}
           <div className="absolute inset-0 bg-gradient-to-t from-black/60 via-transparent to-transparent opacity-0 group-hover:opacity-100 transition-all duration-700"></div>
@@ -1,3 +1,4 @@
+import { publicApi } from './publicApi';
 // API Base URL - замените на ваш реальный API URL
 const API_BASE_URL = import.meta.env?.VITE_API_URL || 'http://localhost:8000';
 interface RequestOptions extends RequestInit {
@@ -42,6 +43,11 @@ class ApiService {
         }));
         throw new Error(error.message || 'API Error');
       }
+
+      // Admin edits show up on the site without waiting for the bootstrap TTL
+      if (fetchOptions.method && fetchOptions.method !== 'GET') {
+        publicApi.invalidateBootstrap();
+      }
       return response.json();
     } catch (error) {
       console.error('API Request Error:', error);
@@ -1,4 +1,5 @@
 const API_BASE_URL = import.meta.env?.VITE_API_URL || 'http://localhost:8000';
+const BOOTSTRAP_TTL_MS = 60 * 1000;
 class PublicApiService {
   private async request(endpoint: string, options: RequestInit = {}) {
     const headers: HeadersInit = {
@@ -47,13 +48,18 @@ class PublicApiService {
   }
 
   // Filters
-  getFilters() {
-    return this.request('/api/products/filters');
+  getFilters(params?: URLSearchParams) {
+    // With the current catalog params, counts are scoped to that selection
+    const queryParams = new URLSearchParams(params);
+    queryParams.delete('page');
+    if (params) queryParams.set('mode', 'selection');
+    const query = queryParams.toString();
+    return this.request(`/api/products/filters${query ? `?${query}` : ''}`);
   }
 
   // Collections
   getCollections() {
-    return this.request('/api/collections');
+    return this.getBootstrap().then(data => data.collections);
   }
   getCollection(id: string) {
     return this.request(`/api/collections/${id}`);
@@ -91,21 +97,44 @@ class PublicApiService {
     });
   }
 
-  // Content
+  // Content: one bootstrap request feeds every section, refetched once it
+  // is older than BOOTSTRAP_TTL_MS so an open page picks up content edits
+  private bootstrap?: Promise<any>;
+  private bootstrapFetchedAt = 0;
+  private bootstrapRevalidate = false;
+  getBootstrap() {
+    if (!this.bootstrap || Date.now() - this.bootstrapFetchedAt > BOOTSTRAP_TTL_MS) {
+      // After an edit, revalidate (ETag) instead of trusting the browser cache
+      const options: RequestInit = this.bootstrapRevalidate ? { cache: 'no-cache' } : {};
+      this.bootstrapRevalidate = false;
+      const bootstrap: Promise<any> = this.request('/api/content/bootstrap', options).catch(error => {
+        // Failures are not cached, the next call retries
+        if (this.bootstrap === bootstrap) this.bootstrap = undefined;
+        throw error;
+      });
+      this.bootstrap = bootstrap;
+      this.bootstrapFetchedAt = Date.now();
+    }
+    return this.bootstrap;
+  }
+  invalidateBootstrap() {
+    this.bootstrap = undefined;
+    this.bootstrapRevalidate = true;
+  }
   getSiteLogo() {
-    return this.request('/api/content/logo');
+    return this.getBootstrap().then(data => data.logo);
   }
   getHeroContent() {
-    return this.request('/api/content/hero');
+    return this.getBootstrap().then(data => data.hero);
   }
   getPromoBanner() {
-    return this.request('/api/content/promo-banner');
+    return this.getBootstrap().then(data => data.promoBanner);
   }
   getFeaturedWatches() {
-    return this.request('/api/content/featured-watches');
+    return this.getBootstrap().then(data => data.featuredWatches);
   }
   getHeritageSection() {
-    return this.request('/api/content/heritage');
+    return this.getBootstrap().then(data => data.heritage);
   }
 }
 export const publicApi = new PublicApiService();
\ No newline at end of file